@@ -0,0 +1,35 @@
+"""answer counters
+
+Revision ID: 3f363d4a2f59
+Revises: 70bac6d081f5
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f363d4a2f59'
+down_revision: Union[str, None] = '70bac6d081f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('answer_counters',
+                    sa.Column('answer_id', sa.Integer(), nullable=False),
+                    sa.Column('count', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['answer_id'], ['answers.id'], ),
+                    sa.PrimaryKeyConstraint('answer_id')
+                    )
+    op.execute("""
+        INSERT INTO answer_counters (answer_id, count)
+        SELECT answer_id, count(*) FROM user_quiz_answer GROUP BY answer_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('answer_counters')
@@ -0,0 +1,41 @@
+"""full text search
+
+Revision ID: 5b1e8c2a9d47
+Revises: e2e39b480d27
+Create Date: 2026-10-18 16:02:47.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e8c2a9d47'
+down_revision: Union[str, None] = 'e2e39b480d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TITLE_DESCRIPTION = ("setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+                     "setweight(to_tsvector('russian', coalesce(description, '')), 'B')")
+SEARCH_DOCUMENTS = {
+    'articles': TITLE_DESCRIPTION + " || setweight(to_tsvector('russian', coalesce(author, '')), 'C')",
+    'quizzes': TITLE_DESCRIPTION,
+    'questions': TITLE_DESCRIPTION,
+}
+
+
+def upgrade() -> None:
+    for table, document in SEARCH_DOCUMENTS.items():
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(),
+                                       sa.Computed(document, persisted=True), nullable=True))
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], unique=False,
+                        postgresql_using='gin')
+
+
+def downgrade() -> None:
+    for table in reversed(list(SEARCH_DOCUMENTS)):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table, postgresql_using='gin')
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,37 @@
+"""media objects
+
+Revision ID: 73ddd178f5eb
+Revises: d3d7cdee413f
+Create Date: 2026-10-18 11:34:52.660127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '73ddd178f5eb'
+down_revision: Union[str, None] = 'd3d7cdee413f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('media_objects',
+                    sa.Column('key', sa.String(), nullable=False),
+                    sa.Column('url', sa.String(), nullable=False),
+                    sa.Column('size', sa.BigInteger(), nullable=False),
+                    sa.Column('content_type', sa.String(), nullable=True),
+                    sa.Column('etag', sa.String(), nullable=True),
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('key')
+                    )
+    op.create_index(op.f('ix_media_objects_id'), 'media_objects', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_media_objects_id'), table_name='media_objects')
+    op.drop_table('media_objects')
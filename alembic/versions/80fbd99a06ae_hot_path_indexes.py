@@ -0,0 +1,55 @@
+"""hot path indexes
+
+Revision ID: 80fbd99a06ae
+Revises: 3f363d4a2f59
+Create Date: 2026-10-18 09:47:03.541772
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '80fbd99a06ae'
+down_revision: Union[str, None] = '3f363d4a2f59'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user_quiz_answer', sa.Column('question_id', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE user_quiz_answer SET question_id = answers.question_id
+        FROM answers WHERE answers.id = user_quiz_answer.answer_id
+    """)
+    # Only the first answer per user and question counts; later duplicates came
+    # from the racy check-then-insert and are dropped before the unique constraint.
+    op.execute("""
+        DELETE FROM user_quiz_answer a USING user_quiz_answer b
+        WHERE a.user_id = b.user_id AND a.question_id = b.question_id AND a.id > b.id
+    """)
+    op.execute("DELETE FROM answer_counters")
+    op.execute("""
+        INSERT INTO answer_counters (answer_id, count)
+        SELECT answer_id, count(*) FROM user_quiz_answer GROUP BY answer_id
+    """)
+    op.alter_column('user_quiz_answer', 'question_id', nullable=False)
+    op.create_foreign_key(None, 'user_quiz_answer', 'questions', ['question_id'], ['id'])
+    op.create_unique_constraint('uq_user_quiz_answer_user_id_question_id',
+                                'user_quiz_answer', ['user_id', 'question_id'])
+    op.create_index('ix_user_quiz_answer_user_id_answer_id',
+                    'user_quiz_answer', ['user_id', 'answer_id'], unique=False)
+    op.create_index(op.f('ix_answers_question_id'), 'answers', ['question_id'], unique=False)
+    op.create_index(op.f('ix_questions_quiz_id'), 'questions', ['quiz_id'], unique=False)
+    op.create_index('ix_stats_user_id_quiz_id', 'stats', ['user_id', 'quiz_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stats_user_id_quiz_id', table_name='stats')
+    op.drop_index(op.f('ix_questions_quiz_id'), table_name='questions')
+    op.drop_index(op.f('ix_answers_question_id'), table_name='answers')
+    op.drop_index('ix_user_quiz_answer_user_id_answer_id', table_name='user_quiz_answer')
+    op.drop_constraint('uq_user_quiz_answer_user_id_question_id', 'user_quiz_answer', type_='unique')
+    op.drop_column('user_quiz_answer', 'question_id')
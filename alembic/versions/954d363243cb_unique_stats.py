@@ -0,0 +1,35 @@
+"""unique stats
+
+Revision ID: 954d363243cb
+Revises: 73ddd178f5eb
+Create Date: 2026-10-18 12:08:19.472931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '954d363243cb'
+down_revision: Union[str, None] = '73ddd178f5eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TEMPORARY TABLE duplicate_stats ON COMMIT DROP AS
+        SELECT a.id FROM stats a JOIN stats b
+        ON a.user_id = b.user_id AND a.quiz_id = b.quiz_id AND a.id > b.id
+    """)
+    op.execute("DELETE FROM stats_answers WHERE stats_id IN (SELECT id FROM duplicate_stats)")
+    op.execute("DELETE FROM stats WHERE id IN (SELECT id FROM duplicate_stats)")
+    op.drop_index('ix_stats_user_id_quiz_id', table_name='stats')
+    op.create_unique_constraint('uq_stats_user_id_quiz_id', 'stats', ['user_id', 'quiz_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_stats_user_id_quiz_id', 'stats', type_='unique')
+    op.create_index('ix_stats_user_id_quiz_id', 'stats', ['user_id', 'quiz_id'], unique=False)
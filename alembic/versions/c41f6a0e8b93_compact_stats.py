@@ -0,0 +1,54 @@
+"""compact stats
+
+Revision ID: c41f6a0e8b93
+Revises: 5b1e8c2a9d47
+Create Date: 2026-10-18 17:24:09.631842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f6a0e8b93'
+down_revision: Union[str, None] = '5b1e8c2a9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('stats', sa.Column('correct_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('stats', sa.Column('total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('stats', sa.Column('correct_answer_ids', postgresql.ARRAY(sa.Integer()),
+                                     server_default='{}', nullable=False))
+    op.execute("""
+        UPDATE stats SET
+            correct_answer_ids = coalesce((
+                SELECT array_agg(answer_id ORDER BY answer_id) FROM stats_answers
+                WHERE stats_answers.stats_id = stats.id), '{}'),
+            total = (SELECT count(*) FROM questions WHERE questions.quiz_id = stats.quiz_id)
+    """)
+    op.execute("UPDATE stats SET correct_count = cardinality(correct_answer_ids)")
+    op.create_index('ix_stats_quiz_id_correct_count', 'stats', ['quiz_id', 'correct_count'], unique=False)
+    op.drop_table('stats_answers')
+
+
+def downgrade() -> None:
+    op.create_table('stats_answers',
+    sa.Column('stats_id', sa.Integer(), nullable=False),
+    sa.Column('answer_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['answer_id'], ['answers.id'], ),
+    sa.ForeignKeyConstraint(['stats_id'], ['stats.id'], ),
+    sa.PrimaryKeyConstraint('stats_id', 'answer_id')
+    )
+    op.execute("""
+        INSERT INTO stats_answers (stats_id, answer_id)
+        SELECT id, unnest(correct_answer_ids) FROM stats
+    """)
+    op.drop_index('ix_stats_quiz_id_correct_count', table_name='stats')
+    op.drop_column('stats', 'correct_answer_ids')
+    op.drop_column('stats', 'total')
+    op.drop_column('stats', 'correct_count')
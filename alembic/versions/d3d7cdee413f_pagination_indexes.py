@@ -0,0 +1,28 @@
+"""pagination indexes
+
+Revision ID: d3d7cdee413f
+Revises: 80fbd99a06ae
+Create Date: 2026-10-18 10:21:15.904318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3d7cdee413f'
+down_revision: Union[str, None] = '80fbd99a06ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_articles_status_id', 'articles', ['status', 'id'], unique=False)
+    op.create_index('ix_gallery_photos_order_id', 'gallery_photos', ['order', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_gallery_photos_order_id', table_name='gallery_photos')
+    op.drop_index('ix_articles_status_id', table_name='articles')
@@ -0,0 +1,54 @@
+"""stats rollups
+
+Revision ID: e2e39b480d27
+Revises: 954d363243cb
+Create Date: 2026-10-18 12:41:07.285514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2e39b480d27'
+down_revision: Union[str, None] = '954d363243cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing answers have no known submission time, so they stay NULL and out of the
+    # history; the default is only set afterwards so new rows get their real time.
+    op.add_column('user_quiz_answer', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    op.alter_column('user_quiz_answer', 'created_at', server_default=sa.text('now()'))
+    for table in ('answer_stats_hourly', 'answer_stats_daily'):
+        op.create_table(table,
+                        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+                        sa.Column('answer_id', sa.Integer(), nullable=False),
+                        sa.Column('question_id', sa.Integer(), nullable=False),
+                        sa.Column('quiz_id', sa.Integer(), nullable=False),
+                        sa.Column('count', sa.Integer(), nullable=False),
+                        sa.ForeignKeyConstraint(['answer_id'], ['answers.id'], ),
+                        sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+                        sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ),
+                        sa.PrimaryKeyConstraint('bucket', 'answer_id')
+                        )
+        op.create_index(f'ix_{table}_quiz_id_bucket', table, ['quiz_id', 'bucket'], unique=False)
+    op.create_table('rollup_watermarks',
+                    sa.Column('name', sa.String(), nullable=False),
+                    sa.Column('last_id', sa.BigInteger(), nullable=False),
+                    sa.PrimaryKeyConstraint('name')
+                    )
+    # Start the rollup after the undated answers instead of scanning past them.
+    op.execute("INSERT INTO rollup_watermarks (name, last_id) "
+               "SELECT 'user_quiz_answer', coalesce(max(id), 0) FROM user_quiz_answer")
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_watermarks')
+    for table in ('answer_stats_daily', 'answer_stats_hourly'):
+        op.drop_index(f'ix_{table}_quiz_id_bucket', table_name=table)
+        op.drop_table(table)
+    op.drop_column('user_quiz_answer', 'created_at')
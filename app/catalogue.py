@@ -0,0 +1,213 @@
+"""Streaming NDJSON export and import of quizzes, articles and gallery photos.
+
+    python -m app.catalogue export > catalogue.ndjson
+    python -m app.catalogue import < catalogue.ndjson
+
+Every line is one row tagged with its ``type``. Parents are exported before their
+children, so an import can remap ids in a single pass. The export contains the
+answer key and drafts, so it is only reachable from this CLI, never over HTTP;
+imported articles always land as drafts and have to be published through the API.
+"""
+import asyncio
+import json
+import sys
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Dict, List, Sequence, Tuple
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.database import dispose_engines, get_async_engine, get_async_replica_engine
+from app.models import Answer, Article, ArticleStatus, Base, GalleryPhoto, Question, Quiz
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 64 * 1024
+# COPY in CSV mode with separators that JSON never contains unescaped writes each
+# row_to_json value out verbatim, so the COPY stream already is NDJSON.
+NDJSON_COPY_OPTIONS = dict(format="csv", quote="\x01", delimiter="\x02")
+
+
+@dataclass(frozen=True)
+class Entity:
+    kind: str
+    model: type[Base]
+    columns: Tuple[str, ...]
+    parent: str | None = None
+    parent_column: str | None = None
+    # Entities referenced by children keep preallocated ids so children can be remapped.
+    remap_ids: bool = False
+    # Columns whose imported value is fixed regardless of the input.
+    overrides: Tuple[Tuple[str, object], ...] = ()
+
+    @property
+    def table(self) -> str:
+        return self.model.__tablename__
+
+    @property
+    def import_columns(self) -> Tuple[str, ...]:
+        return ("id", *self.columns) if self.remap_ids else self.columns
+
+
+ENTITIES = [
+    Entity("quiz", Quiz, ("title", "description", "photos_url", "preview_photo"), remap_ids=True),
+    Entity("question", Question, ("quiz_id", "title", "description", "photos_url"),
+           parent="quiz", parent_column="quiz_id", remap_ids=True),
+    Entity("answer", Answer, ("question_id", "title", "after_title", "photos_url", "is_correct"),
+           parent="question", parent_column="question_id"),
+    Entity("article", Article, ("title", "description", "content_url", "photo_url", "author", "status"),
+           overrides=(("status", ArticleStatus.DRAFT.name),)),
+    Entity("gallery_photo", GalleryPhoto, ("title", "description", "order", "url")),
+]
+ENTITY_BY_KIND = {entity.kind: entity for entity in ENTITIES}
+
+
+def quote(identifier: str) -> str:
+    return f'"{identifier}"'
+
+
+def export_query(entity: Entity) -> str:
+    columns = ", ".join(quote(column) for column in ("id", *entity.columns))
+    return (f"SELECT row_to_json(t) FROM (SELECT '{entity.kind}' AS type, {columns} "
+            f"FROM {quote(entity.table)} ORDER BY id) AS t")
+
+
+async def driver_connection(conn: AsyncConnection) -> asyncpg.Connection:
+    return (await conn.get_raw_connection()).driver_connection
+
+
+async def export_catalogue() -> AsyncIterator[bytes]:
+    chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=16)
+
+    async def produce():
+        try:
+            async with get_async_replica_engine().connect() as conn:
+                raw = await driver_connection(conn)
+                # One snapshot for all tables so children never point at missing parents.
+                async with raw.transaction(isolation="repeatable_read", readonly=True):
+                    await raw.execute("SET LOCAL statement_timeout = 0")
+                    for entity in ENTITIES:
+                        await raw.copy_from_query(export_query(entity), output=chunks.put, **NDJSON_COPY_OPTIONS)
+        finally:
+            # A cancelled producer has no reader left to receive the sentinel.
+            if not asyncio.current_task().cancelling():
+                await chunks.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+        # Surfaces a failed COPY instead of ending the stream as if it were complete.
+        await producer
+    finally:
+        producer.cancel()
+
+
+async def iter_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+    buffer = b""
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield parse_record(line)
+    if buffer.strip():
+        yield parse_record(buffer)
+
+
+def parse_record(line: bytes) -> dict:
+    record = json.loads(line)
+    if not isinstance(record, dict) or record.get("type") not in ENTITY_BY_KIND:
+        raise ValueError(f"unknown record: {line[:200]!r}")
+    return record
+
+
+class CatalogueImport:
+    def __init__(self, conn: asyncpg.Connection):
+        self.conn = conn
+        self.id_maps: Dict[str, Dict[int, int]] = {entity.kind: {} for entity in ENTITIES if entity.remap_ids}
+        self.free_ids: Dict[str, List[int]] = {kind: [] for kind in self.id_maps}
+        self.rows: Dict[str, List[tuple]] = {entity.kind: [] for entity in ENTITIES}
+        self.counts: Dict[str, int] = {entity.table: 0 for entity in ENTITIES}
+
+    async def add(self, record: dict):
+        entity = ENTITY_BY_KIND[record["type"]]
+        values = {column: record.get(column) for column in entity.columns}
+        values.update(entity.overrides)
+        if entity.parent is not None:
+            try:
+                values[entity.parent_column] = self.id_maps[entity.parent][values[entity.parent_column]]
+            except (KeyError, TypeError):
+                raise ValueError(f"{entity.kind} {record.get('id')} refers to unknown "
+                                 f"{entity.parent} {values[entity.parent_column]}")
+        if entity.remap_ids:
+            if not isinstance(record.get("id"), int):
+                raise ValueError(f"{entity.kind} without an id")
+            values["id"] = self.id_maps[entity.kind][record["id"]] = await self.next_id(entity)
+
+        rows = self.rows[entity.kind]
+        rows.append(tuple(values[column] for column in entity.import_columns))
+        if len(rows) >= BATCH_SIZE:
+            await self.flush(entity)
+
+    async def next_id(self, entity: Entity) -> int:
+        free = self.free_ids[entity.kind]
+        if not free:
+            # Ids come from the table's own sequence a batch at a time, so they never
+            # collide with rows inserted concurrently by the API.
+            free.extend(reversed(await self.conn.fetchval(
+                "SELECT array_agg(nextval(pg_get_serial_sequence($1, 'id'))) FROM generate_series(1, $2)",
+                entity.table, BATCH_SIZE)))
+        return free.pop()
+
+    async def flush(self, entity: Entity):
+        if entity.parent is not None:
+            # Children may only reach COPY once the rows they reference are in.
+            await self.flush(ENTITY_BY_KIND[entity.parent])
+        rows = self.rows[entity.kind]
+        if not rows:
+            return
+        try:
+            await self.conn.copy_records_to_table(entity.table, records=rows, columns=entity.import_columns)
+        except asyncpg.PostgresError as e:
+            raise ValueError(f"{entity.kind}: {e}") from e
+        self.counts[entity.table] += len(rows)
+        rows.clear()
+
+    async def finish(self) -> Dict[str, int]:
+        for entity in ENTITIES:
+            await self.flush(entity)
+        return self.counts
+
+
+async def import_catalogue(chunks: AsyncIterable[bytes]) -> Dict[str, int]:
+    async with get_async_engine().connect() as conn:
+        raw = await driver_connection(conn)
+        async with raw.transaction():
+            await raw.execute("SET LOCAL statement_timeout = 0")
+            catalogue_import = CatalogueImport(raw)
+            async for record in iter_records(chunks):
+                await catalogue_import.add(record)
+            return await catalogue_import.finish()
+
+
+async def read_stdin() -> AsyncIterator[bytes]:
+    while chunk := await asyncio.to_thread(sys.stdin.buffer.read, CHUNK_SIZE):
+        yield chunk
+
+
+async def main(argv: Sequence[str]):
+    try:
+        if argv == ["export"]:
+            async for chunk in export_catalogue():
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        elif argv == ["import"]:
+            counts = await import_catalogue(read_stdin())
+            print(", ".join(f"{table}: {count}" for table, count in counts.items()), file=sys.stderr)
+        else:
+            sys.exit("usage: python -m app.catalogue export|import")
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
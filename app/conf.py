@@ -1,4 +1,6 @@
 import os
+from functools import lru_cache
+from typing import List, cast
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,10 +10,46 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_USER: str
     DB_PASSWORD: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 5
+    DB_POOL_RECYCLE: int = 1800
+    # Pinging costs extra round trips on every checkout; stale connections are
+    # bounded by DB_POOL_RECYCLE instead.
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_TIMEOUT_MS: int = 10000
+    DB_PGBOUNCER: bool = False
+    DB_REPLICA_HOST: str | None = None
+    DB_REPLICA_PORT: int | None = None
+    READ_YOUR_WRITES_SECONDS: float = 5
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
     AWS_BUCKET_NAME: str
     AWS_URL: str
+    AWS_UPLOAD_PART_SIZE: int = 10 * 1024 * 1024
+    AWS_PRESIGN_EXPIRES: int = 3600
+    IMAGE_VARIANT_WIDTHS: List[int] = []
+    IMAGE_VARIANT_QUALITY: int = 80
+    IMAGE_VARIANT_MAX_BYTES: int = 20 * 1024 * 1024
+    # Per serving worker, so the total is workers * IMAGE_PROCESS_WORKERS processes.
+    IMAGE_PROCESS_WORKERS: int = 1
+    QUIZ_SNAPSHOT_CACHE_SIZE: int = 256
+    # Per process, and only the worker that handled a submit refreshes its entry; other
+    # workers stay coherent because reads carrying the read-your-writes marker bypass it.
+    USER_ANSWERS_CACHE_SIZE: int = 10000
+    USER_ANSWERS_CACHE_TTL: float = 30
+    STATS_QUEUE_SIZE: int = 10000
+    STATS_BATCH_SIZE: int = 500
+    STATS_FLUSH_INTERVAL_MS: float = 5
+    ROLLUP_INTERVAL_SECONDS: float = 60
+    ROLLUP_BATCH_SIZE: int = 50000
+    ROLLUP_GRACE_SECONDS: float = 60
+    HISTORY_MAX_HOURLY_DAYS: int = 31
+    HISTORY_MAX_DAILY_DAYS: int = 731
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+    HEALTH_CHECK_TTL: float = 5
+    HEALTH_CHECK_TIMEOUT: float = 2
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(
@@ -19,9 +57,41 @@ class Settings(BaseSettings):
     )
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+class LazySettings:
+    # Defers reading the environment until a setting is first used, so importing
+    # the app (alembic, CLIs, workers) has no side effects.
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+
+settings = cast(Settings, LazySettings())
+
+
+def get_read_your_writes_seconds() -> float:
+    # Must outlast any answer cache entry read before the write, so no worker can
+    # serve such an entry to a client that sends the marker back.
+    if settings.USER_ANSWERS_CACHE_SIZE > 0:
+        return max(settings.READ_YOUR_WRITES_SECONDS, settings.USER_ANSWERS_CACHE_TTL)
+    return settings.READ_YOUR_WRITES_SECONDS
 
 
 def get_db_url():
     return (f"postgresql+psycopg2://{settings.DB_USER}:{settings.DB_PASSWORD}@"
             f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}")
+
+
+def get_async_db_url():
+    return (f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
+            f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}")
+
+
+def get_async_replica_db_url():
+    if not settings.DB_REPLICA_HOST:
+        return None
+    return (f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
+            f"{settings.DB_REPLICA_HOST}:{settings.DB_REPLICA_PORT or settings.DB_PORT}/{settings.DB_NAME}")
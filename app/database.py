@@ -1,13 +1,119 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator
+from uuid import uuid4
 
-from app.conf import get_db_url
+from sqlalchemy import Engine, NullPool, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 
-DATABASE_URL = get_db_url()
+from app.conf import get_async_db_url, get_async_replica_db_url, get_db_url, settings
+from app.metrics import instrument_engine
 
-engine = create_engine(DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_pool_options() -> dict:
+    if settings.DB_PGBOUNCER:
+        # PgBouncer does the pooling; keeping our own pool would pin server connections.
+        return dict(poolclass=NullPool)
+    return dict(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+
+def get_async_connect_args() -> dict:
+    timeout = settings.DB_STATEMENT_TIMEOUT_MS
+    if settings.DB_PGBOUNCER:
+        # Transaction pooling can't keep prepared statements or startup parameters,
+        # so the statement timeout is enforced on the client side instead.
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+        if timeout:
+            connect_args["command_timeout"] = timeout / 1000
+        return connect_args
+    if timeout:
+        return {"server_settings": {"statement_timeout": str(timeout)}}
+    return {}
+
+
+def get_connect_args() -> dict:
+    if settings.DB_STATEMENT_TIMEOUT_MS and not settings.DB_PGBOUNCER:
+        return {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return {}
+
+
+@lru_cache
+def get_engine() -> Engine:
+    return create_engine(get_db_url(), connect_args=get_connect_args(), **get_pool_options())
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    async_engine = create_async_engine(
+        get_async_db_url(), connect_args=get_async_connect_args(), **get_pool_options())
+    instrument_engine(async_engine.sync_engine, "primary")
+    return async_engine
+
+
+@lru_cache
+def get_async_replica_engine() -> AsyncEngine:
+    url = get_async_replica_db_url()
+    if url is None:
+        return get_async_engine()
+    replica_engine = create_async_engine(
+        url, connect_args=get_async_connect_args(), **get_pool_options())
+    instrument_engine(replica_engine.sync_engine, "replica")
+    return replica_engine
+
+
+def has_replica() -> bool:
+    return get_async_replica_engine() is not get_async_engine()
+
+
+@lru_cache
+def get_sessionmaker() -> sessionmaker[Session]:
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@lru_cache
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+@lru_cache
+def get_async_replica_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=get_async_replica_engine(), autoflush=False, expire_on_commit=False)
+
+
+def SessionLocal() -> Session:
+    return get_sessionmaker()()
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    return get_async_sessionmaker()()
+
+
+def AsyncReplicaSessionLocal() -> AsyncSession:
+    return get_async_replica_sessionmaker()()
+
+
+async def dispose_engines():
+    if get_async_replica_engine.cache_info().currsize and has_replica():
+        await get_async_replica_engine().dispose()
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
 
 
 def get_db():
@@ -16,3 +122,48 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+class RecentWriters:
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._until: OrderedDict[str, float] = OrderedDict()
+
+    def mark(self, user_id: str, seconds: float):
+        self._until[user_id] = time.monotonic() + seconds
+        self._until.move_to_end(user_id)
+        while len(self._until) > self.maxsize:
+            self._until.popitem(last=False)
+
+    def __contains__(self, user_id: str) -> bool:
+        until = self._until.get(user_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._until[user_id]
+            return False
+        return True
+
+
+# Users who wrote a moment ago keep reading from the primary until the replica has
+# caught up, so they always see their own writes.
+recent_writers = RecentWriters()
+
+
+@asynccontextmanager
+async def session_scope(replica: bool = False) -> AsyncIterator[AsyncSession]:
+    # Connections are checked out lazily on the first statement, so handlers served
+    # from in-process caches never hold a pool slot.
+    session_factory = AsyncReplicaSessionLocal if replica and has_replica() else AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
+
+
+async def get_async_db():
+    async with session_scope() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with session_scope(replica=True) as db:
+        yield db
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy import text
+
+from app.conf import settings
+from app.database import get_async_engine, get_async_replica_engine, has_replica
+from app.media import get_s3_service
+
+logger = logging.getLogger(__name__)
+
+
+class CachedCheck:
+    def __init__(self, name: str, probe: Callable[[], Awaitable[None]]):
+        self.name = name
+        self.probe = probe
+        self._ok = False
+        self._checked_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < settings.HEALTH_CHECK_TTL
+
+    async def __call__(self) -> bool:
+        if self._fresh():
+            return self._ok
+        # Concurrent probes share one round trip instead of stampeding the dependency.
+        async with self._lock:
+            if self._fresh():
+                return self._ok
+            try:
+                await asyncio.wait_for(self.probe(), settings.HEALTH_CHECK_TIMEOUT)
+                self._ok = True
+            except Exception as e:
+                logger.warning("Readiness check %s failed: %r", self.name, e)
+                self._ok = False
+            self._checked_at = time.monotonic()
+            return self._ok
+
+
+async def probe_database():
+    async with get_async_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def probe_replica():
+    if has_replica():
+        async with get_async_replica_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+
+async def probe_storage():
+    if not await asyncio.to_thread(get_s3_service().bucket_exists):
+        raise LookupError(f"Bucket {settings.AWS_BUCKET_NAME} does not exist")
+
+
+readiness_checks = [CachedCheck("database", probe_database), CachedCheck("replica", probe_replica),
+                    CachedCheck("storage", probe_storage)]
+
+
+async def check_readiness() -> Dict[str, bool]:
+    results = await asyncio.gather(*(check() for check in readiness_checks))
+    return {check.name: ok for check, ok in zip(readiness_checks, results)}
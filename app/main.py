@@ -1,266 +1,429 @@
-from typing import List
-from fastapi import FastAPI, HTTPException, Depends, Security, UploadFile, File
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from math import ceil
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response, Security, UploadFile, File
+from fastapi.responses import JSONResponse
 from fastapi.security import APIKeyHeader
-from prometheus_client import make_asgi_app
-from sqlalchemy import func
-from app.models import Answer, ArticleStatus, Quiz, UserQuizAnswer, Question, Article, Stats, GalleryPhoto
-from app.schemas import AnswerResponse, AnswerStatsResponse, ArticleUpdateBody, QuestionResponse, QuestionStatsResponse, \
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models import AnswerCounter, AnswerStatsDaily, AnswerStatsHourly, ArticleStatus, Quiz, Article, Stats, \
+    GalleryPhoto, MediaObject
+from app.schemas import AnswerBatchCreate, AnswerStatsResponse, AnswerSubmitResponse, ArticleUpdateBody, QuestionStatsResponse, \
     QuizCreate, QuizIDResponse, QuizResponse, ArticleResponse, MediaResponse, ArticleCreateBody, QuizStatsResponse, \
-    GalleryPhotoResponse, GalleryPhotoCreate
-from app.database import get_db
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import joinedload, Session
-from app.media import s3_service
-
-app = FastAPI()
-
-metrics_app = make_asgi_app()
+    GalleryPhotoResponse, GalleryPhotoCreate, Page, UploadAbortBody, UploadConfirmBody, UploadPresignBody, UploadPresignResponse, \
+    QuestionHistoryResponse, QuizHistoryResponse, QuizRankResponse, ScoreResponse, SearchResultResponse
+from app.database import dispose_engines, get_async_db, get_async_read_db, has_replica, recent_writers, session_scope
+from sqlalchemy.exc import DBAPIError, IntegrityError, TimeoutError as SATimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.conf import get_read_your_writes_seconds, get_settings, settings
+from app.health import check_readiness
+from app.media import DIRECT_UPLOAD_PREFIX, get_s3_service
+from app.media.images import shutdown_process_pool
+from app.metrics import MetricsMiddleware, make_metrics_app
+from app.quiz.rollup import run_periodically as run_rollups_periodically
+from app.pagination import decode_cursor, encode_cursor, page_limit
+from app.search import SearchKind, search
+from app.responses import answer_submit_adapter, article_list_adapter, article_page_adapter, gallery_list_adapter, \
+    gallery_page_adapter, json_response, quiz_adapter, quiz_history_adapter, quiz_list_adapter, quiz_stats_adapter, \
+    score_page_adapter, search_page_adapter
+from app.quiz import get_answer_quiz_id, get_quiz_progress, get_quiz_snapshot, get_snapshot_progress, \
+    get_user_answer_ids, insert_quizzes, load_user_answer_ids, make_stats, record_answers, render_quiz, \
+    quiz_snapshots, render_submission, stats_queue, user_answer_cache, validate_quiz
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on bad configuration, but leave connecting to the database and
+    # storage to the first request and /readyz so startup never waits on them.
+    get_settings()
+    quiz_snapshots.maxsize = settings.QUIZ_SNAPSHOT_CACHE_SIZE
+    user_answer_cache.maxsize = settings.USER_ANSWERS_CACHE_SIZE
+    user_answer_cache.ttl = settings.USER_ANSWERS_CACHE_TTL
+    stats_queue.maxsize = settings.STATS_QUEUE_SIZE
+    stats_queue.batch_size = settings.STATS_BATCH_SIZE
+    stats_queue.interval = settings.STATS_FLUSH_INTERVAL_MS / 1000
+    stats_queue.start()
+    rollup_task = None
+    if settings.ROLLUP_INTERVAL_SECONDS > 0:
+        rollup_task = asyncio.create_task(run_rollups_periodically(settings.ROLLUP_INTERVAL_SECONDS))
+    yield
+    if rollup_task is not None:
+        rollup_task.cancel()
+    await stats_queue.stop()
+    shutdown_process_pool()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware, exclude=("/metrics", "/healthz", "/readyz"))
+
+metrics_app = make_metrics_app()
 app.mount("/metrics", metrics_app)
 
+QUERY_CANCELED = "57014"
+READ_PRIMARY_COOKIE = "read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
 
-def get_user_id(authorization: str | None = Security(api_key_header)) -> str:
+@app.exception_handler(SATimeoutError)
+async def pool_timeout_handler(request: Request, exc: SATimeoutError):
+    return JSONResponse(status_code=503, content={"detail": "Сервис перегружен, попробуйте позже"},
+                        headers={"Retry-After": "1"})
+
+
+@app.exception_handler(DBAPIError)
+async def statement_timeout_handler(request: Request, exc: DBAPIError):
+    if isinstance(exc.orig, TimeoutError):
+        return await command_timeout_handler(request, exc.orig)
+    if exc.orig is None or getattr(exc.orig, "pgcode", getattr(exc.orig, "sqlstate", None)) != QUERY_CANCELED:
+        raise exc
+    return JSONResponse(status_code=503, content={"detail": "Сервис перегружен, попробуйте позже"},
+                        headers={"Retry-After": "1"})
+
+
+# In PgBouncer mode the statement timeout is asyncpg's client-side command_timeout,
+# which raises asyncio.TimeoutError (the builtin TimeoutError) instead of 57014.
+@app.exception_handler(TimeoutError)
+async def command_timeout_handler(request: Request, exc: TimeoutError):
+    return JSONResponse(status_code=503, content={"detail": "Сервис перегружен, попробуйте позже"},
+                        headers={"Retry-After": "1"})
+
+
+@app.get('/healthz')
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get('/readyz')
+async def readyz():
+    checks = await check_readiness()
+    ready = all(checks.values())
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "status": "ok" if ready else "unavailable",
+        "checks": {name: "ok" if ok else "failed" for name, ok in checks.items()},
+    })
+
+
+async def get_user_id(authorization: str | None = Security(api_key_header)) -> str:
     if authorization is None:
         raise HTTPException(status_code=401, detail="Необходима регистрация")
     return authorization
 
 
+def mark_write(response: Response, user_id: str) -> Response:
+    if has_replica() or user_answer_cache.maxsize > 0:
+        seconds = get_read_your_writes_seconds()
+        recent_writers.mark(user_id, seconds)
+        # recent_writers only covers this process. Other workers and instances learn about
+        # the write only if the client sends the deadline back, in the header or the cookie.
+        until = f"{time.time() + seconds:.3f}"
+        response.headers[READ_PRIMARY_HEADER] = until
+        response.set_cookie(READ_PRIMARY_COOKIE, until, max_age=ceil(seconds), httponly=True)
+    return response
+
+
+def wrote_recently(request: Request, user_id: str, read_primary_until: float | None = None) -> bool:
+    if user_id in recent_writers:
+        return True
+    if read_primary_until is not None and read_primary_until > time.time():
+        return True
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def reads_own_writes(request: Request, user_id: str = Depends(get_user_id),
+                           read_primary_until: float | None = Header(
+                               None, alias=READ_PRIMARY_HEADER,
+                               description="Echo of the X-Read-Primary-Until header returned by the last write, "
+                                           "so that this read sees it whichever worker serves it")) -> bool:
+    # Recent writers skip both the replica and the per-process answer cache.
+    return wrote_recently(request, user_id, read_primary_until)
+
+
+async def get_user_read_db(fresh: bool = Depends(reads_own_writes)):
+    async with session_scope(replica=not fresh) as db:
+        yield db
+
+
 @app.get('/quiz', response_model=List[QuizResponse])
-def get_quizes(db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
-    quizes = db.query(Quiz).options(joinedload(Quiz.questions)).all()
-    quiz_responses = []
+async def get_quizes(db: AsyncSession = Depends(get_user_read_db), user_id: str = Depends(get_user_id)):
+    quizes = (await db.execute(select(Quiz.id, Quiz.title, Quiz.description))).mappings().all()
+    progress = await get_quiz_progress(db, user_id)
 
-    for quiz in quizes:
-        user_answers = db.query(UserQuizAnswer).join(Answer).join(Question).filter(
-            UserQuizAnswer.user_id == user_id, Question.quiz_id == quiz.id).all()
+    return json_response(quiz_list_adapter, [
+        {**quiz, "is_completed": quiz["id"] in progress and progress[quiz["id"]].is_completed}
+        for quiz in quizes], validate=True)
 
-        quiz_completed = len(user_answers) == len(quiz.questions)
 
-        quiz_responses.append(QuizResponse(
-            id=quiz.id,
-            title=quiz.title,
-            description=quiz.description,
-            is_completed=quiz_completed,
-        ))
+@app.post('/quiz', response_model=QuizResponse)
+async def create_quiz(quiz: QuizCreate, response: Response, db: AsyncSession = Depends(get_async_db),
+                      user_id: str = Depends(get_user_id)):
+    validate_quiz(quiz)
 
-    return quiz_responses
+    quiz_id, = await insert_quizzes(db, [quiz])
+    await db.commit()
+    mark_write(response, user_id)
 
+    return QuizResponse(id=quiz_id, title=quiz.title, description=quiz.description,
+                        photos_url=quiz.photos_url, preview_photo=quiz.preview_photo)
 
-@app.post('/quiz')
-def create_quiz(quiz: QuizCreate, db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
-    if len(quiz.questions) < 1:
-        raise HTTPException(
-            status_code=400, detail="Викторина должна содержать хотя бы 1 вопрос")
-    for question in quiz.questions:
-        if len(question.answers) < 1:
-            raise HTTPException(
-                status_code=400, detail="На вопрос необходим хотя бы 1 ответ")
 
-    new_quiz = Quiz(
-        title=quiz.title,
-        description=quiz.description,
-        photos_url=quiz.photos_url,
-        preview_photo=quiz.preview_photo,
-    )
-    db.add(new_quiz)
-    db.commit()
-    db.refresh(new_quiz)
-    for question in quiz.questions:
-        new_question = Question(
-            title=question.title,
-            description=question.description,
-            photos_url=question.photos_url,
-            quiz_id=new_quiz.id
-        )
-        db.add(new_question)
-        db.commit()
-        db.refresh(new_question)
+@app.post('/quiz/bulk', response_model=List[QuizResponse])
+async def create_quizzes(quizzes: List[QuizCreate], response: Response, db: AsyncSession = Depends(get_async_db),
+                         user_id: str = Depends(get_user_id)):
+    for quiz in quizzes:
+        validate_quiz(quiz)
+    if not quizzes:
+        return []
 
-        for answer in question.answers:
-            new_answer = Answer(
-                title=answer.title,
-                after_title=answer.after_title,
-                photos_url=answer.photos_url,
-                is_correct=answer.is_correct,
-                question_id=new_question.id
-            )
-            db.add(new_answer)
-            db.commit()
-            db.refresh(new_answer)
-    return new_quiz
+    quiz_ids = await insert_quizzes(db, quizzes)
+    await db.commit()
+    mark_write(response, user_id)
+
+    return [QuizResponse(id=quiz_id, title=quiz.title, description=quiz.description,
+                         photos_url=quiz.photos_url, preview_photo=quiz.preview_photo)
+            for quiz_id, quiz in zip(quiz_ids, quizzes)]
 
 
 @app.get('/quiz/{quiz_id}', response_model=QuizIDResponse)
-def get_quiz(quiz_id: int, user_id: str = Depends(get_user_id), db: Session = Depends(get_db)):
-    quiz = db.query(Quiz).options(joinedload(Quiz.questions)
-                                  ).filter(Quiz.id == quiz_id).first()
+async def get_quiz(quiz_id: int, user_id: str = Depends(get_user_id), fresh: bool = Depends(reads_own_writes),
+                   db: AsyncSession = Depends(get_user_read_db)):
+    snapshot = await get_quiz_snapshot(db, quiz_id)
 
-    if quiz is None:
+    if snapshot is None:
         raise HTTPException(status_code=404, detail="Викторина не найдена")
 
-    user_answers = db.query(UserQuizAnswer).join(Answer).join(Question).filter(
-        UserQuizAnswer.user_id == user_id, Question.quiz_id == quiz_id).all()
-    question_answered = [
-        question for question in quiz.questions if any(ua.answer_id in [
-            a.id for a in question.answers] for ua in user_answers)]
-    quiz_completed = len(user_answers) == len(quiz.questions)
-
-    questions_response = []
-    for question in quiz.questions:
-        answers_response = [
-            AnswerResponse(
-                id=answer.id,
-                title=answer.title,
-                after_title=answer.after_title,
-                photos_url=answer.photos_url,
-                is_chosen=any(ua.answer_id ==
-                              answer.id for ua in user_answers),
-                is_correct=answer.is_correct if question in question_answered else None,
-            )
-            for answer in question.answers
-        ]
-        questions_response.append(
-            QuestionResponse(
-                id=question.id,
-                title=question.title,
-                description=question.description,
-                photos_url=question.photos_url,
-                is_answered=any(ua.answer_id in [
-                    a.id for a in question.answers] for ua in user_answers),
-                answers=answers_response
-            )
-        )
+    chosen_answer_ids = await get_user_answer_ids(db, user_id, snapshot, use_cache=not fresh)
+    quiz_completed = get_snapshot_progress(snapshot, chosen_answer_ids).is_completed
 
-    return QuizIDResponse(
-        id=quiz.id,
-        title=quiz.title,
-        description=quiz.description,
-        is_completed=quiz_completed,
-        questions=questions_response,
-    )
+    return json_response(quiz_adapter, render_quiz(snapshot, chosen_answer_ids, quiz_completed))
 
 
-@app.post('/answer/{answer_id}')
-def submit_answer(answer_id: int, user_id: str = Depends(get_user_id), db: Session = Depends(get_db)):
-    answer = db.query(Answer).join(Question).join(
-        Quiz).filter(Answer.id == answer_id).first()
-    if answer is None:
+@app.post('/answer/{answer_id}', response_model=AnswerSubmitResponse | QuizIDResponse)
+async def submit_answer(answer_id: int, full: bool = False, user_id: str = Depends(get_user_id),
+                        db: AsyncSession = Depends(get_async_db)):
+    quiz_id = await get_answer_quiz_id(db, answer_id)
+    snapshot = await get_quiz_snapshot(db, quiz_id) if quiz_id is not None else None
+    if snapshot is None or answer_id not in snapshot.question_by_answer:
         raise HTTPException(
             status_code=404, detail="Ответ на вопрос не найден")
 
-    question_answers = [answer.id for answer in answer.question.answers]
-
-    if db.query(UserQuizAnswer).filter(UserQuizAnswer.answer_id.in_(question_answers),
-                                       UserQuizAnswer.user_id == user_id).first():
-        raise HTTPException(status_code=400, detail="Ответ уже дан")
+    try:
+        is_accepted = bool(await record_answers(db, user_id, snapshot, [answer_id]))
+        chosen_answer_ids = await load_user_answer_ids(db, user_id, snapshot)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Ошибка сохранения ответа")
+    user_answer_cache.put(user_id, snapshot.id, chosen_answer_ids)
+
+    quiz_completed = get_snapshot_progress(snapshot, chosen_answer_ids).is_completed
+    if is_accepted and quiz_completed:
+        await stats_queue.save(db, make_stats(user_id, snapshot, chosen_answer_ids))
+
+    if full:
+        if not is_accepted:
+            raise HTTPException(status_code=400, detail="Ответ уже дан")
+        return mark_write(
+            json_response(quiz_adapter, render_quiz(snapshot, chosen_answer_ids, quiz_completed)), user_id)
+    return mark_write(json_response(
+        answer_submit_adapter,
+        render_submission(snapshot, answer_id, chosen_answer_ids, is_accepted, quiz_completed)), user_id)
+
+
+@app.post('/quiz/{quiz_id}/answers', response_model=QuizIDResponse)
+async def submit_answers(quiz_id: int, batch: AnswerBatchCreate, user_id: str = Depends(get_user_id),
+                         db: AsyncSession = Depends(get_async_db)):
+    snapshot = await get_quiz_snapshot(db, quiz_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Викторина не найдена")
 
-    user_answer = UserQuizAnswer(user_id=user_id, answer_id=answer_id)
+    answered_questions = set()
+    for answer_id in batch.answer_ids:
+        question = snapshot.question_by_answer.get(answer_id)
+        if question is None:
+            raise HTTPException(
+                status_code=404, detail="Ответ на вопрос не найден")
+        if question.id in answered_questions:
+            raise HTTPException(
+                status_code=400, detail="На каждый вопрос можно дать только один ответ")
+        answered_questions.add(question.id)
 
     try:
-        db.add(user_answer)
-        db.commit()
+        inserted = await record_answers(db, user_id, snapshot, batch.answer_ids) if batch.answer_ids else set()
+        chosen_answer_ids = await load_user_answer_ids(db, user_id, snapshot)
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Ошибка сохранения ответа")
+    user_answer_cache.put(user_id, snapshot.id, chosen_answer_ids)
+
+    quiz_completed = get_snapshot_progress(snapshot, chosen_answer_ids).is_completed
+    if inserted and quiz_completed:
+        await stats_queue.save(db, make_stats(user_id, snapshot, chosen_answer_ids))
+
+    return mark_write(json_response(quiz_adapter, render_quiz(snapshot, chosen_answer_ids, quiz_completed)), user_id)
 
-    user_answers = db.query(UserQuizAnswer).join(Answer).join(Question).join(Quiz).filter(
-        UserQuizAnswer.user_id == user_id, Answer.question_id == Question.id, Question.quiz_id == Quiz.id,
-        Quiz.id == answer.question.quiz.id).all()
-    if len(user_answers) == len(answer.question.quiz.questions):
-        correct_answers = db.query(Answer).join(Question).filter(
-            Question.quiz_id == answer.question.quiz.id, Answer.is_correct == True).all()
-        stats = Stats(user_id=user_id, quiz_id=answer.question.quiz.id, correct_answers=[
-            answer for answer in correct_answers if
-            answer.id in [user_answer.answer_id for user_answer in user_answers]])
-        try:
-            db.add(stats)
-            db.commit()
-        except IntegrityError:
-            db.rollback()
-            raise HTTPException(
-                status_code=400, detail="Ошибка сохранения статистики")
 
-    return get_quiz(answer.question.quiz.id, user_id, db)
+@app.get('/article', response_model=Page[ArticleResponse] | List[ArticleResponse])
+async def get_articles(cursor: str | None = None, limit: int | None = Query(None, ge=1), unpaginated: bool = False,
+                       db: AsyncSession = Depends(get_async_read_db)):
+    query = select(Article.id, Article.title, Article.description, Article.author, Article.content_url,
+                   Article.photo_url).where(Article.status == ArticleStatus.PUBLISHED).order_by(Article.id)
+    if unpaginated:
+        articles = (await db.execute(query)).all()
+        return json_response(article_list_adapter, articles, validate=True)
 
+    limit = page_limit(limit)
+    if cursor is not None:
+        last_id, = decode_cursor(cursor, 1)
+        query = query.where(Article.id > last_id)
+    articles = (await db.execute(query.limit(limit + 1))).all()
 
-@app.get('/article', response_model=List[ArticleResponse])
-def get_articles(db: Session = Depends(get_db)):
-    articles = db.query(Article).filter(
-        Article.status == ArticleStatus.PUBLISHED).all()
-    return articles
+    next_cursor = encode_cursor(articles[limit - 1].id) if len(articles) > limit else None
+    return json_response(article_page_adapter, {"items": articles[:limit], "next_cursor": next_cursor},
+                         validate=True)
 
 
 @app.post('/article', response_model=ArticleResponse)
-def create_article(article: ArticleCreateBody, db: Session = Depends(get_db)):
+async def create_article(article: ArticleCreateBody, db: AsyncSession = Depends(get_async_db)):
     article = Article(**article.model_dump(), status=ArticleStatus.DRAFT)
     db.add(article)
-    db.commit()
+    await db.commit()
     return article
 
 
 @app.get('/article/{article_id}', response_model=ArticleResponse)
-def get_article(article_id: int, db: Session = Depends(get_db)):
-    article = db.query(Article).filter(
-        Article.id == article_id, Article.status == ArticleStatus.PUBLISHED).first()
+async def get_article(article_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    article = await db.scalar(select(Article).where(
+        Article.id == article_id, Article.status == ArticleStatus.PUBLISHED))
     if article is None:
         raise HTTPException(status_code=404, detail="Статья не найдена")
     return article
 
 
 @app.patch('/article/{article_id}', response_model=ArticleResponse)
-def update_article(article_id: int, article: ArticleUpdateBody, db: Session = Depends(get_db)):
-    article_to_update = db.query(Article).filter(
-        Article.id == article_id).first()
+async def update_article(article_id: int, article: ArticleUpdateBody, db: AsyncSession = Depends(get_async_db)):
+    article_to_update = await db.scalar(select(Article).where(
+        Article.id == article_id))
     if article_to_update is None:
         raise HTTPException(status_code=404, detail="Статья не найдена")
     for key, value in article.model_dump(exclude_unset=True).items():
         setattr(article_to_update, key, value)
-    db.commit()
+    await db.commit()
     return article_to_update
 
 
 @app.post('/upload', response_model=MediaResponse)
-def upload_file(name: str | None = None, file: UploadFile = File(...)):
-    file_url = s3_service.upload_file(file.file, name or file.filename)
+async def upload_file(name: str | None = None, file: UploadFile = File(...)):
+    file_url, variants = await get_s3_service().upload_image_async(
+        file.file, name or file.filename, file.content_type)
 
     if not file_url:
         raise HTTPException(
             status_code=400, detail="Ошибка при загрузке файла")
 
-    return {"url": file_url}
+    return {"url": file_url, "variants": variants}
+
+
+@app.post('/upload/presign', response_model=UploadPresignResponse)
+async def presign_upload(body: UploadPresignBody):
+    expires = timedelta(seconds=settings.AWS_PRESIGN_EXPIRES)
+    try:
+        presigned = await asyncio.to_thread(
+            get_s3_service().presign_upload, body.filename, body.content_type, body.parts, expires)
+    except Exception:
+        logger.exception("Presigning an upload of %r failed", body.filename)
+        raise HTTPException(
+            status_code=400, detail="Ошибка при загрузке файла")
+    return UploadPresignResponse(**presigned, expires_in=settings.AWS_PRESIGN_EXPIRES)
+
+
+@app.post('/upload/confirm', response_model=MediaResponse)
+async def confirm_upload(body: UploadConfirmBody, db: AsyncSession = Depends(get_async_db)):
+    if not body.key.startswith(DIRECT_UPLOAD_PREFIX):
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    try:
+        stored = await asyncio.to_thread(get_s3_service().complete_upload, body.key, body.upload_id,
+                                         [(part.part_number, part.etag) for part in body.parts])
+    except Exception:
+        logger.exception("Completing the upload of %s failed", body.key)
+        raise HTTPException(status_code=404, detail="Файл не найден")
+
+    url = get_s3_service().get_url(body.key)
+    await db.execute(pg_insert(MediaObject).values(
+        key=body.key, url=url, size=stored.size, content_type=stored.content_type, etag=stored.etag,
+    ).on_conflict_do_nothing(index_elements=[MediaObject.key]))
+    await db.commit()
+    return {"url": url}
+
+
+@app.post('/upload/abort', status_code=204)
+async def abort_upload(body: UploadAbortBody):
+    # Parts of an upload that is never completed or aborted stay billed in the bucket.
+    if not body.key.startswith(DIRECT_UPLOAD_PREFIX):
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    try:
+        await asyncio.to_thread(get_s3_service().abort_upload, body.key, body.upload_id)
+    except Exception:
+        logger.exception("Aborting the upload of %s failed", body.key)
+        raise HTTPException(status_code=404, detail="Файл не найден")
+
+
+@app.get('/stats', response_model=Page[ScoreResponse])
+async def get_scores(cursor: str | None = None, limit: int | None = Query(None, ge=1),
+                     user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_user_read_db)):
+    limit = page_limit(limit)
+    query = (select(Stats.quiz_id, Stats.correct_count, Stats.total)
+             .where(Stats.user_id == user_id).order_by(Stats.quiz_id))
+    if cursor is not None:
+        last_quiz_id, = decode_cursor(cursor, 1)
+        query = query.where(Stats.quiz_id > last_quiz_id)
+    scores = (await db.execute(query.limit(limit + 1))).all()
+
+    next_cursor = encode_cursor(scores[limit - 1].quiz_id) if len(scores) > limit else None
+    return json_response(score_page_adapter, {"items": scores[:limit], "next_cursor": next_cursor},
+                         validate=True)
 
 
 @app.get('/stats/{quiz_id}', response_model=QuizStatsResponse)
-def get_stats(quiz_id: int, user_id: str = Depends(get_user_id), db: Session = Depends(get_db)):
-    stats = db.query(Stats).join(Quiz).filter(Stats.quiz_id == quiz_id,
-                                              Stats.user_id == user_id, Quiz.id == quiz_id).first()
-    if stats is None:
+async def get_stats(quiz_id: int, user_id: str = Depends(get_user_id),
+                    db: AsyncSession = Depends(get_user_read_db)):
+    stats_id = await db.scalar(select(Stats.id).where(
+        Stats.quiz_id == quiz_id, Stats.user_id == user_id).limit(1))
+    snapshot = await get_quiz_snapshot(db, quiz_id) if stats_id is not None else None
+    if snapshot is None:
         raise HTTPException(
             status_code=404, detail="Статистики этого вопроса нет")
 
-    questions_response = []
-    for question in stats.quiz.questions:
-        counts = (db.query(Answer.is_correct, func.count().label("count")).join(
-            UserQuizAnswer).filter(Answer.question_id == question.id).group_by(Answer.is_correct).all())
+    counts = dict((await db.execute(select(AnswerCounter.answer_id, AnswerCounter.count).where(
+        AnswerCounter.answer_id.in_(snapshot.answer_ids)))).all())
 
+    questions_response = []
+    for question in snapshot.questions:
         correct_answers_count = 0
         incorrect_answers_count = 0
+        answers_response = []
 
-        for is_correct, count in counts:
-            if is_correct:
-                correct_answers_count = count
+        for answer in question.answers:
+            count = counts.get(answer.id, 0)
+            if answer.is_correct:
+                correct_answers_count += count
             else:
-                incorrect_answers_count = count
-        answers_response = [
-            AnswerStatsResponse(
-                id=answer.id,
-                title=answer.title,
-                count=db.query(UserQuizAnswer).filter(
-                    UserQuizAnswer.answer_id == answer.id).count()
-            )
-            for answer in question.answers
-        ]
+                incorrect_answers_count += count
+            answers_response.append(
+                AnswerStatsResponse(id=answer.id, title=answer.title, count=count))
+
         questions_response.append(
             QuestionStatsResponse(
                 question_id=question.id,
@@ -270,19 +433,122 @@ def get_stats(quiz_id: int, user_id: str = Depends(get_user_id), db: Session = D
                 answers=answers_response
             )
         )
-    return QuizStatsResponse(questions=questions_response)
+    return json_response(quiz_stats_adapter, QuizStatsResponse(questions=questions_response))
+
+
+@app.get('/stats/{quiz_id}/rank', response_model=QuizRankResponse)
+async def get_rank(quiz_id: int, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_user_read_db)):
+    score = (await db.execute(select(Stats.correct_count, Stats.total).where(
+        Stats.quiz_id == quiz_id, Stats.user_id == user_id))).first()
+    if score is None:
+        raise HTTPException(
+            status_code=404, detail="Статистики этого вопроса нет")
+
+    better, participants = (await db.execute(
+        select(func.count().filter(Stats.correct_count > score.correct_count), func.count())
+        .where(Stats.quiz_id == quiz_id))).one()
+    return QuizRankResponse(quiz_id=quiz_id, correct_count=score.correct_count, total=score.total,
+                            rank=better + 1, participants=participants)
+
+
+@app.get('/stats/{quiz_id}/history', response_model=QuizHistoryResponse)
+async def get_stats_history(quiz_id: int, start: datetime | None = None, end: datetime | None = None,
+                            granularity: Literal["hour", "day"] = "day", user_id: str = Depends(get_user_id),
+                            db: AsyncSession = Depends(get_user_read_db)):
+    end = end or datetime.now(timezone.utc)
+    start = start or end - (timedelta(days=7) if granularity == "hour" else timedelta(days=90))
+    if start.tzinfo is None or end.tzinfo is None or start >= end:
+        raise HTTPException(status_code=400, detail="Некорректный период")
+    max_days = settings.HISTORY_MAX_HOURLY_DAYS if granularity == "hour" else settings.HISTORY_MAX_DAILY_DAYS
+    if end - start > timedelta(days=max_days):
+        raise HTTPException(status_code=400, detail=f"Слишком длинный период, максимум дней: {max_days}")
+
+    # Like /stats/{quiz_id}: the split into correct and incorrect answers gives the
+    # answer key away, so it is only shown once the user has completed the quiz.
+    stats_id = await db.scalar(select(Stats.id).where(
+        Stats.quiz_id == quiz_id, Stats.user_id == user_id).limit(1))
+    snapshot = await get_quiz_snapshot(db, quiz_id) if stats_id is not None else None
+    if snapshot is None:
+        raise HTTPException(
+            status_code=404, detail="Статистики этого вопроса нет")
+
+    rollup = AnswerStatsHourly if granularity == "hour" else AnswerStatsDaily
+    rows = await db.execute(select(rollup.bucket, rollup.answer_id, rollup.count).where(
+        rollup.quiz_id == quiz_id, rollup.bucket >= start, rollup.bucket < end).order_by(rollup.bucket))
+    counts = {}
+    for bucket, answer_id, count in rows:
+        counts.setdefault(bucket, {})[answer_id] = count
+
+    points = []
+    for bucket, answer_counts in counts.items():
+        for question in snapshot.questions:
+            if question.answer_ids.isdisjoint(answer_counts):
+                continue
+            correct_answers_count = 0
+            incorrect_answers_count = 0
+            answers_response = []
+
+            for answer in question.answers:
+                count = answer_counts.get(answer.id, 0)
+                if answer.is_correct:
+                    correct_answers_count += count
+                else:
+                    incorrect_answers_count += count
+                answers_response.append(
+                    AnswerStatsResponse(id=answer.id, title=answer.title, count=count))
+
+            points.append(QuestionHistoryResponse(
+                bucket=bucket,
+                question_id=question.id,
+                correct_answers=correct_answers_count,
+                incorrect_answers=incorrect_answers_count,
+                answers=answers_response,
+            ))
+
+    return json_response(quiz_history_adapter, QuizHistoryResponse(
+        granularity=granularity, start=start, end=end, points=points))
+
 
+@app.get('/search', response_model=Page[SearchResultResponse])
+async def search_content(q: str = Query(..., min_length=1, max_length=256), kind: SearchKind | None = None,
+                         cursor: str | None = None, limit: int | None = Query(None, ge=1),
+                         db: AsyncSession = Depends(get_async_read_db)):
+    limit = page_limit(limit)
+    # Results are ordered by rank, so the cursor carries an offset rather than a key.
+    offset, = decode_cursor(cursor, 1) if cursor is not None else (0,)
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    results = await search(db, q, kind, limit + 1, offset)
 
-@app.get('/gallery', response_model=List[GalleryPhotoResponse])
-def get_gallery_photos(db: Session = Depends(get_db)):
-    photos = db.query(GalleryPhoto).all()
-    return photos
+    next_cursor = encode_cursor(offset + limit) if len(results) > limit else None
+    return json_response(search_page_adapter, {"items": results[:limit], "next_cursor": next_cursor},
+                         validate=True)
+
+
+@app.get('/gallery', response_model=Page[GalleryPhotoResponse] | List[GalleryPhotoResponse])
+async def get_gallery_photos(cursor: str | None = None, limit: int | None = Query(None, ge=1),
+                             unpaginated: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    query = select(GalleryPhoto.id, GalleryPhoto.title, GalleryPhoto.description, GalleryPhoto.order,
+                   GalleryPhoto.url).order_by(GalleryPhoto.order, GalleryPhoto.id)
+    if unpaginated:
+        photos = (await db.execute(query)).all()
+        return json_response(gallery_list_adapter, photos, validate=True)
+
+    limit = page_limit(limit)
+    if cursor is not None:
+        last_order, last_id = decode_cursor(cursor, 2)
+        query = query.where(tuple_(GalleryPhoto.order, GalleryPhoto.id) > tuple_(last_order, last_id))
+    photos = (await db.execute(query.limit(limit + 1))).all()
+
+    next_cursor = encode_cursor(photos[limit - 1].order, photos[limit - 1].id) if len(photos) > limit else None
+    return json_response(gallery_page_adapter, {"items": photos[:limit], "next_cursor": next_cursor},
+                         validate=True)
 
 
 @app.post('/gallery', response_model=GalleryPhotoResponse)
-def create_gallery_photo(
+async def create_gallery_photo(
         photo_data: GalleryPhotoCreate,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     photo = GalleryPhoto(
         title=photo_data.title,
@@ -291,5 +557,6 @@ def create_gallery_photo(
         url=photo_data.url
     )
     db.add(photo)
-    db.commit()
+    await db.commit()
     return photo
+
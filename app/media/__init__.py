@@ -1,11 +1,30 @@
-from .service import S3Service
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
 from app.conf import settings
 
-s3_service = S3Service(
-    access_key=settings.AWS_ACCESS_KEY_ID,
-    secret_key=settings.AWS_SECRET_ACCESS_KEY,
-    endpoint=settings.AWS_URL,
-    bucket_name=settings.AWS_BUCKET_NAME
-)
+if TYPE_CHECKING:
+    from .service import S3Service
+
+DIRECT_UPLOAD_PREFIX = "uploads/"
+
+
+@lru_cache
+def get_s3_service() -> "S3Service":
+    # minio is only imported once storage is first used, not when the app is loaded.
+    from .service import S3Service
+
+    return S3Service(
+        access_key=settings.AWS_ACCESS_KEY_ID,
+        secret_key=settings.AWS_SECRET_ACCESS_KEY,
+        endpoint=settings.AWS_URL,
+        bucket_name=settings.AWS_BUCKET_NAME,
+        part_size=settings.AWS_UPLOAD_PART_SIZE,
+        variant_widths=settings.IMAGE_VARIANT_WIDTHS,
+        variant_quality=settings.IMAGE_VARIANT_QUALITY,
+        variant_max_bytes=settings.IMAGE_VARIANT_MAX_BYTES,
+        variant_workers=settings.IMAGE_PROCESS_WORKERS,
+    )
+
 
-__all__ = [s3_service]
+__all__ = ["DIRECT_UPLOAD_PREFIX", "get_s3_service"]
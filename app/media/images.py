@@ -0,0 +1,56 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Dict, Sequence
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_process_pool(max_workers: int = 1) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Workers are spawned rather than forked so they don't inherit the event loop
+        # and the connection pools of the serving process.
+        _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_make_variants(data: bytes, widths: Sequence[int], quality: int,
+                            max_workers: int = 1) -> Dict[int, bytes]:
+    pool = get_process_pool(max_workers)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, make_variants, data, widths, quality)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed on a huge image); the executor is unusable from
+        # now on, so drop it and let the next upload start a fresh one.
+        if _pool is pool:
+            shutdown_process_pool()
+        raise
+
+
+def make_variants(data: bytes, widths: Sequence[int], quality: int) -> Dict[int, bytes]:
+    # Runs in a worker process; Pillow is only needed where variants are enabled.
+    from PIL import Image, ImageOps
+
+    variants = {}
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for width in sorted(set(widths)):
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            output = BytesIO()
+            image.resize((width, height), Image.Resampling.LANCZOS).save(output, "WEBP", quality=quality)
+            variants[width] = output.getvalue()
+    return variants
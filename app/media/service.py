@@ -1,27 +1,150 @@
-from random import randint
-from typing import BinaryIO
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+from typing import BinaryIO, Dict, List, Sequence
+from uuid import uuid4
+
 from minio import Minio
+from minio.datatypes import Object, Part
+from minio.error import S3Error
+
+from app.media import DIRECT_UPLOAD_PREFIX
+from app.media.images import run_make_variants
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+PUBLIC_READ = {'x-amz-acl': 'public-read'}
+
+logger = logging.getLogger(__name__)
+
+
+class HashingReader:
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.file.read(size)
+        self.hash.update(chunk)
+        return chunk
 
 
 class S3Service:
-    def __init__(self, access_key: str, secret_key: str, endpoint: str, bucket_name: str):
-        self.client = Minio(endpoint, access_key=access_key,
-                            secret_key=secret_key)
+    def __init__(self, access_key: str, secret_key: str, endpoint: str, bucket_name: str,
+                 part_size: int = MIN_PART_SIZE, client: Minio | None = None,
+                 variant_widths: Sequence[int] = (), variant_quality: int = 80,
+                 variant_max_bytes: int = 20 * 1024 * 1024, variant_workers: int = 1):
+        self.client = client or Minio(endpoint, access_key=access_key,
+                                      secret_key=secret_key)
         self.url = endpoint
         self.bucket_name = bucket_name
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.variant_widths = tuple(variant_widths)
+        self.variant_quality = variant_quality
+        self.variant_max_bytes = variant_max_bytes
+        self.variant_workers = variant_workers
+
+    def get_url(self, key: str) -> str:
+        return f"https://{self.bucket_name}.{self.url}/{key}"
+
+    async def upload_image_async(self, file: BinaryIO, filename: str,
+                                 content_type: str | None = None) -> tuple[str | None, Dict[int, str]]:
+        try:
+            key = await asyncio.to_thread(self.put_file, file, filename, content_type)
+        except Exception:
+            logger.exception("Uploading %r failed", filename)
+            return None, {}
 
-    def upload_file(self, file: BinaryIO, filename: str):
+        if not self.variant_widths or not (content_type or "").startswith("image/"):
+            return self.get_url(key), {}
         try:
-            file.seek(0, 2)
-            size = file.tell()
+            variants = await self.put_variants(file, key)
+        except Exception:
+            logger.exception("Making image variants of %s failed", key)
+            variants = {}
+        return self.get_url(key), {width: self.get_url(variant_key) for width, variant_key in variants.items()}
+
+    async def put_variants(self, file: BinaryIO, key: str) -> Dict[int, str]:
+        stem = os.path.splitext(key)[0]
+        keys = {width: f"{stem}-{width}w.webp" for width in self.variant_widths}
+        existing = {width: variant_key for width, variant_key in keys.items()
+                    if await asyncio.to_thread(self.exists, variant_key)}
+        if len(existing) == len(keys):
+            return existing
+
+        file.seek(0, 2)
+        if file.tell() > self.variant_max_bytes:
+            return existing
+        file.seek(0)
+        data = await asyncio.to_thread(file.read)
+
+        variants = await run_make_variants(
+            data, [width for width in keys if width not in existing], self.variant_quality, self.variant_workers)
+        for width, blob in variants.items():
+            await asyncio.to_thread(self.client.put_object, self.bucket_name, keys[width], BytesIO(blob), len(blob),
+                                    content_type="image/webp", metadata=PUBLIC_READ)
+            existing[width] = keys[width]
+        return existing
+
+    def put_file(self, file: BinaryIO, filename: str, content_type: str | None = None) -> str:
+        # Keys are the SHA-256 of the content, so identical uploads share one object. The
+        # file must be seekable (UploadFile spools to a temporary file): it is hashed in a
+        # first pass and only uploaded, in a second pass, if the key is not stored yet.
+        extension = os.path.splitext(filename or "")[1].lower()
+        file.seek(0)
+        reader = HashingReader(file)
+        while reader.read(HASH_CHUNK_SIZE):
+            pass
+        key = f"{reader.hash.hexdigest()}{extension}"
+        if not self.exists(key):
             file.seek(0)
+            self.client.put_object(self.bucket_name, key, file, -1,
+                                   content_type=content_type or "application/octet-stream",
+                                   part_size=self.part_size, metadata=PUBLIC_READ)
+        return key
+
+    def presign_upload(self, filename: str, content_type: str | None, parts: int, expires: timedelta) -> dict:
+        # Always multipart, even for a single part: a presigned PUT cannot carry the
+        # ACL and Content-Type, whereas here they are fixed when the upload is created.
+        key = f"{DIRECT_UPLOAD_PREFIX}{uuid4().hex}{os.path.splitext(filename or '')[1].lower()}"
+        upload_id = self._create_multipart_upload(key, {
+            "Content-Type": content_type or "application/octet-stream", **PUBLIC_READ})
+        part_urls = [
+            self.client.get_presigned_url("PUT", self.bucket_name, key, expires=expires,
+                                          extra_query_params={"uploadId": upload_id, "partNumber": str(number)})
+            for number in range(1, parts + 1)
+        ]
+        return {"key": key, "upload_id": upload_id, "part_urls": part_urls}
 
-            key = f"{filename}-{randint(1, 1000)}"
+    def complete_upload(self, key: str, upload_id: str, parts: List[tuple[int, str]]) -> Object:
+        self._complete_multipart_upload(key, upload_id, [Part(number, etag) for number, etag in sorted(parts)])
+        return self.client.stat_object(self.bucket_name, key)
 
-            self.client.put_object(self.bucket_name, key, file, size, metadata={
-                                   'x-amz-acl': 'public-read'})
+    def abort_upload(self, key: str, upload_id: str):
+        self._abort_multipart_upload(key, upload_id)
+
+    # minio-py only exposes multipart uploads through private methods, so every use of
+    # them goes through these wrappers and minio is pinned to the version they match.
+    def _create_multipart_upload(self, key: str, headers: Dict[str, str]) -> str:
+        return self.client._create_multipart_upload(self.bucket_name, key, headers)
+
+    def _complete_multipart_upload(self, key: str, upload_id: str, parts: List[Part]):
+        self.client._complete_multipart_upload(self.bucket_name, key, upload_id, parts)
+
+    def _abort_multipart_upload(self, key: str, upload_id: str):
+        self.client._abort_multipart_upload(self.bucket_name, key, upload_id)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.stat_object(self.bucket_name, key)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+                return False
+            raise
 
-            return f"https://{self.bucket_name}.{self.url}/{key}"
-        except Exception as e:
-            print(e)
-            return None
+    def bucket_exists(self) -> bool:
+        return self.client.bucket_exists(self.bucket_name)
@@ -0,0 +1,141 @@
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, List
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, make_asgi_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served", ["method"],
+    multiprocess_mode="livesum")
+
+DB_QUERIES = Counter("db_queries_total", "Database statements executed", ["route"])
+DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Time spent executing database statements", ["route"])
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Database statements per HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+DB_SECONDS_PER_REQUEST = Histogram(
+    "db_seconds_per_request", "Database time per HTTP request", ["route"])
+
+# Gauges are summed over live workers, so pool numbers read as totals for the instance.
+POOL_SIZE = Gauge("db_pool_size", "Configured connection pool size", ["pool"], multiprocess_mode="livesum")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["pool"],
+                         multiprocess_mode="livesum")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Overflow connections currently open", ["pool"],
+                      multiprocess_mode="livesum")
+POOL_WAIT = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection", ["pool"])
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    seconds: float = 0.0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+_pool_gauge_updaters: List[Callable[[], None]] = []
+
+
+def make_metrics_app():
+    # Under a multi-worker server each process writes its samples to
+    # PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them, whichever worker answers.
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return make_asgi_app()
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+
+def instrument_engine(engine: Engine, name: str):
+    pool = engine.pool
+    connect = pool.connect
+
+    # Times checkouts where they happen, whenever a session first needs a connection.
+    def timed_connect():
+        with POOL_WAIT.labels(name).time():
+            return connect()
+
+    pool.connect = timed_connect
+    if hasattr(pool, "checkedout"):
+        # Values are pushed on checkout and after every request rather than read via
+        # set_function, which multiprocess collection can't see.
+        POOL_SIZE.labels(name).set(pool.size())
+
+        def update_pool_gauges(*args):
+            POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+            POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+
+        event.listen(pool, "checkout", update_pool_gauges)
+        _pool_gauge_updaters.append(update_pool_gauges)
+
+    # The start time lives on the statement's execution context rather than on the pooled
+    # connection, so a statement that raises doesn't leave it behind.
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_query(context)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        if exception_context.execution_context is not None:
+            record_query(exception_context.execution_context)
+
+
+def record_query(context):
+    start = getattr(context, "query_start", None)
+    stats = _request_stats.get()
+    if start is None or stats is None:
+        return
+    stats.queries += 1
+    stats.seconds += time.perf_counter() - start
+    # handle_error can also fire after after_cursor_execute (e.g. while fetching rows).
+    del context.query_start
+
+
+class MetricsMiddleware:
+    def __init__(self, app, exclude: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude):
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            _request_stats.reset(token)
+
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(method, route, status).observe(elapsed)
+            DB_QUERIES.labels(route).inc(stats.queries)
+            DB_QUERY_SECONDS.labels(route).inc(stats.seconds)
+            DB_QUERIES_PER_REQUEST.labels(route).observe(stats.queries)
+            DB_SECONDS_PER_REQUEST.labels(route).observe(stats.seconds)
+            for update_pool_gauges in _pool_gauge_updaters:
+                update_pool_gauges()
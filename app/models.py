@@ -1,5 +1,8 @@
+from datetime import datetime
 from typing import List, Annotated
-from sqlalchemy import Column, ForeignKey, Enum, ARRAY, String, Table
+from sqlalchemy import ForeignKey, Enum, ARRAY, String, Integer, UniqueConstraint, Index, BigInteger, DateTime, \
+    func, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column
 import enum
 
@@ -7,6 +10,13 @@ PrimaryKey = Annotated[int, mapped_column(primary_key=True, index=True)]
 StrList = List[str]
 
 
+def tsvector_column(*weighted_columns: tuple[str, str]):
+    document = " || ".join(
+        f"setweight(to_tsvector('russian', coalesce({column}, '')), '{weight}')"
+        for column, weight in weighted_columns)
+    return mapped_column(TSVECTOR, Computed(document, persisted=True), deferred=True)
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -17,13 +27,6 @@ class BaseModel(Base):
     id: Mapped[PrimaryKey]
 
 
-stats_answers_association = Table(
-    "stats_answers",
-    Base.metadata,
-    Column("stats_id", ForeignKey("stats.id"), primary_key=True),
-    Column("answer_id", ForeignKey("answers.id"), primary_key=True))
-
-
 class Answer(BaseModel):
     __tablename__ = 'answers'
 
@@ -32,23 +35,24 @@ class Answer(BaseModel):
     photos_url: Mapped[List[str] | None] = mapped_column(
         ARRAY(String), nullable=True)
     is_correct: Mapped[bool | None]
-    question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"))
+    question_id: Mapped[int] = mapped_column(
+        ForeignKey("questions.id"), index=True)
 
     question: Mapped["Question"] = relationship(back_populates='answers')
 
-    stats: Mapped[List["Stats"]] = relationship(
-        "Stats", secondary=stats_answers_association, back_populates="correct_answers"
-    )
-
 
 class Question(BaseModel):
     __tablename__ = 'questions'
+    __table_args__ = (
+        Index("ix_questions_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     title: Mapped[str] = mapped_column(nullable=False)
     description: Mapped[str | None]
-    quiz_id: Mapped[int] = mapped_column(ForeignKey("quizzes.id"))
+    quiz_id: Mapped[int] = mapped_column(ForeignKey("quizzes.id"), index=True)
     photos_url: Mapped[List[str] | None] = mapped_column(
         ARRAY(String), nullable=True)
+    search_vector: Mapped[str | None] = tsvector_column(("title", "A"), ("description", "B"))
 
     answers: Mapped[List["Answer"]] = relationship(back_populates='question')
     quiz: Mapped["Quiz"] = relationship(back_populates='questions')
@@ -56,12 +60,16 @@ class Question(BaseModel):
 
 class Quiz(BaseModel):
     __tablename__ = 'quizzes'
+    __table_args__ = (
+        Index("ix_quizzes_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     title: Mapped[str] = mapped_column(nullable=False)
     description: Mapped[str | None]
     photos_url: Mapped[List[str] | None] = mapped_column(
         ARRAY(String), nullable=True)
     preview_photo: Mapped[str | None]
+    search_vector: Mapped[str | None] = tsvector_column(("title", "A"), ("description", "B"))
 
     questions: Mapped[List["Question"]] = relationship(back_populates='quiz')
     stats: Mapped[List["Stats"]] = relationship(back_populates='quiz')
@@ -69,19 +77,71 @@ class Quiz(BaseModel):
 
 class UserQuizAnswer(BaseModel):
     __tablename__ = 'user_quiz_answer'
+    __table_args__ = (
+        UniqueConstraint("user_id", "question_id",
+                         name="uq_user_quiz_answer_user_id_question_id"),
+        Index("ix_user_quiz_answer_user_id_answer_id", "user_id", "answer_id"),
+    )
 
     answer_id: Mapped[int] = mapped_column(ForeignKey("answers.id"))
+    question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"))
     user_id: Mapped[str] = mapped_column(nullable=False)
+    # NULL for answers given before submission times were recorded.
+    created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class AnswerCounter(Base):
+    __tablename__ = 'answer_counters'
+
+    answer_id: Mapped[int] = mapped_column(
+        ForeignKey("answers.id"), primary_key=True)
+    count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class AnswerRollupMixin:
+    bucket: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True)
+    answer_id: Mapped[int] = mapped_column(
+        ForeignKey("answers.id"), primary_key=True)
+    question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"))
+    quiz_id: Mapped[int] = mapped_column(ForeignKey("quizzes.id"))
+    count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class AnswerStatsHourly(AnswerRollupMixin, Base):
+    __tablename__ = 'answer_stats_hourly'
+    __table_args__ = (
+        Index("ix_answer_stats_hourly_quiz_id_bucket", "quiz_id", "bucket"),
+    )
+
+
+class AnswerStatsDaily(AnswerRollupMixin, Base):
+    __tablename__ = 'answer_stats_daily'
+    __table_args__ = (
+        Index("ix_answer_stats_daily_quiz_id_bucket", "quiz_id", "bucket"),
+    )
+
+
+class RollupWatermark(Base):
+    __tablename__ = 'rollup_watermarks'
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    last_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
 
 
 class Stats(BaseModel):
     __tablename__ = 'stats'
+    __table_args__ = (
+        UniqueConstraint("user_id", "quiz_id", name="uq_stats_user_id_quiz_id"),
+        Index("ix_stats_quiz_id_correct_count", "quiz_id", "correct_count"),
+    )
 
     user_id: Mapped[str] = mapped_column(nullable=False)
     quiz_id: Mapped[int] = mapped_column(ForeignKey("quizzes.id"))
-    correct_answers: Mapped[List["Answer"]] = relationship(
-        "Answer", secondary=stats_answers_association, back_populates="stats"
-    )
+    correct_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    total: Mapped[int] = mapped_column(nullable=False, default=0)
+    correct_answer_ids: Mapped[List[int]] = mapped_column(
+        ARRAY(Integer), nullable=False, default=list)
 
     quiz: Mapped["Quiz"] = relationship(back_populates='stats')
 
@@ -94,6 +154,10 @@ class ArticleStatus(enum.Enum):
 
 class Article(BaseModel):
     __tablename__ = 'articles'
+    __table_args__ = (
+        Index("ix_articles_status_id", "status", "id"),
+        Index("ix_articles_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     title: Mapped[str] = mapped_column(nullable=False)
     description: Mapped[str | None]
@@ -105,13 +169,27 @@ class Article(BaseModel):
         nullable=False,
         default=ArticleStatus.DRAFT
     )
+    search_vector: Mapped[str | None] = tsvector_column(("title", "A"), ("description", "B"), ("author", "C"))
 
 
 class GalleryPhoto(BaseModel):
     __tablename__ = 'gallery_photos'
+    __table_args__ = (
+        Index("ix_gallery_photos_order_id", "order", "id"),
+    )
 
     id: Mapped[PrimaryKey]
     title: Mapped[str | None] = mapped_column(nullable=True)
     description: Mapped[str | None] = mapped_column(nullable=True)
     order: Mapped[int] = mapped_column(default=0)
     url: Mapped[str] = mapped_column(nullable=False)
+
+
+class MediaObject(BaseModel):
+    __tablename__ = 'media_objects'
+
+    key: Mapped[str] = mapped_column(nullable=False, unique=True)
+    url: Mapped[str] = mapped_column(nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    content_type: Mapped[str | None]
+    etag: Mapped[str | None]
@@ -0,0 +1,25 @@
+import base64
+import json
+from typing import Any, List
+
+from fastapi import HTTPException
+
+from app.conf import settings
+
+
+def encode_cursor(*values: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, int) for v in values):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return values
+
+
+def page_limit(limit: int | None) -> int:
+    return min(limit or settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX)
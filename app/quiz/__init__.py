@@ -0,0 +1,14 @@
+from .completion import QuizProgress, get_quiz_progress, get_snapshot_progress
+from .creation import insert_quizzes, validate_quiz
+from .render import render_quiz, render_submission
+from .snapshot import QuizSnapshot, get_answer_quiz_id, get_quiz_snapshot, quiz_snapshots
+from .stats_writer import stats_queue
+from .submission import PendingStats, make_stats, reconcile_stats, record_answers, write_stats
+from .user_answers import get_user_answer_ids, load_user_answer_ids, user_answer_cache
+
+__all__ = ["QuizProgress", "get_quiz_progress", "get_snapshot_progress",
+           "insert_quizzes", "validate_quiz",
+           "render_quiz", "render_submission",
+           "QuizSnapshot", "get_answer_quiz_id", "get_quiz_snapshot", "quiz_snapshots",
+           "stats_queue", "PendingStats", "make_stats", "reconcile_stats", "record_answers", "write_stats",
+           "get_user_answer_ids", "load_user_answer_ids", "user_answer_cache"]
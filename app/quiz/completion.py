@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from typing import AbstractSet, Dict, Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Answer, Question, Quiz, UserQuizAnswer
+from app.quiz.snapshot import QuizSnapshot
+
+
+@dataclass(frozen=True, slots=True)
+class QuizProgress:
+    answered: int
+    total: int
+
+    @property
+    def is_completed(self) -> bool:
+        return self.answered == self.total
+
+
+async def get_quiz_progress(db: AsyncSession, user_id: str,
+                            quiz_ids: Iterable[int] | None = None) -> Dict[int, QuizProgress]:
+    totals = select(Question.quiz_id, func.count(Question.id).label("total"))
+    answered = (select(Question.quiz_id, func.count(func.distinct(Question.id)).label("answered"))
+                .join(Answer, Answer.question_id == Question.id)
+                .join(UserQuizAnswer, UserQuizAnswer.answer_id == Answer.id)
+                .where(UserQuizAnswer.user_id == user_id))
+    query = select(Quiz.id)
+
+    if quiz_ids is not None:
+        quiz_ids = list(quiz_ids)
+        totals = totals.where(Question.quiz_id.in_(quiz_ids))
+        answered = answered.where(Question.quiz_id.in_(quiz_ids))
+        query = query.where(Quiz.id.in_(quiz_ids))
+
+    totals = totals.group_by(Question.quiz_id).subquery()
+    answered = answered.group_by(Question.quiz_id).subquery()
+    query = (query.add_columns(func.coalesce(answered.c.answered, 0),
+                               func.coalesce(totals.c.total, 0))
+             .outerjoin(totals, totals.c.quiz_id == Quiz.id)
+             .outerjoin(answered, answered.c.quiz_id == Quiz.id))
+
+    return {quiz_id: QuizProgress(answered=answered_count, total=total)
+            for quiz_id, answered_count, total in await db.execute(query)}
+
+
+def get_snapshot_progress(snapshot: QuizSnapshot, chosen_answer_ids: AbstractSet[int]) -> QuizProgress:
+    answered = {snapshot.question_by_answer[answer_id].id
+                for answer_id in chosen_answer_ids if answer_id in snapshot.question_by_answer}
+    return QuizProgress(answered=len(answered), total=len(snapshot.questions))
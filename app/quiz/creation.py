@@ -0,0 +1,42 @@
+from typing import List, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Answer, Question, Quiz
+from app.quiz.snapshot import quiz_snapshots
+from app.schemas import QuizCreate
+
+
+def validate_quiz(quiz: QuizCreate):
+    if len(quiz.questions) < 1:
+        raise HTTPException(
+            status_code=400, detail="Викторина должна содержать хотя бы 1 вопрос")
+    for question in quiz.questions:
+        if len(question.answers) < 1:
+            raise HTTPException(
+                status_code=400, detail="На вопрос необходим хотя бы 1 ответ")
+
+
+async def insert_quizzes(db: AsyncSession, quizzes: Sequence[QuizCreate]) -> List[int]:
+    quiz_ids = (await db.scalars(insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True), [
+        dict(title=quiz.title, description=quiz.description,
+             photos_url=quiz.photos_url, preview_photo=quiz.preview_photo)
+        for quiz in quizzes])).all()
+
+    questions = [(quiz_id, question)
+                 for quiz_id, quiz in zip(quiz_ids, quizzes) for question in quiz.questions]
+    question_ids = (await db.scalars(insert(Question).returning(Question.id, sort_by_parameter_order=True), [
+        dict(title=question.title, description=question.description,
+             photos_url=question.photos_url, quiz_id=quiz_id)
+        for quiz_id, question in questions])).all()
+
+    await db.execute(insert(Answer), [
+        dict(title=answer.title, after_title=answer.after_title, photos_url=answer.photos_url,
+             is_correct=answer.is_correct, question_id=question_id)
+        for question_id, (_, question) in zip(question_ids, questions) for answer in question.answers])
+
+    for quiz_id in quiz_ids:
+        quiz_snapshots.invalidate(quiz_id)
+    return list(quiz_ids)
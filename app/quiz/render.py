@@ -0,0 +1,59 @@
+from typing import AbstractSet, List
+
+from app.quiz.snapshot import QuestionSnapshot, QuizSnapshot
+from app.schemas import AnswerResponse, AnswerSubmitResponse, QuestionResponse, QuizIDResponse
+
+
+def render_answers(question: QuestionSnapshot, chosen_answer_ids: AbstractSet[int],
+                   is_answered: bool) -> List[AnswerResponse]:
+    return [
+        AnswerResponse(
+            id=answer.id,
+            title=answer.title,
+            after_title=answer.after_title,
+            photos_url=answer.photos_url,
+            is_chosen=answer.id in chosen_answer_ids,
+            is_correct=answer.is_correct if is_answered else None,
+        )
+        for answer in question.answers
+    ]
+
+
+def render_quiz(snapshot: QuizSnapshot, chosen_answer_ids: AbstractSet[int],
+                is_completed: bool) -> QuizIDResponse:
+    questions_response = []
+    for question in snapshot.questions:
+        is_answered = not question.answer_ids.isdisjoint(chosen_answer_ids)
+        questions_response.append(
+            QuestionResponse(
+                id=question.id,
+                title=question.title,
+                description=question.description,
+                photos_url=question.photos_url,
+                is_answered=is_answered,
+                answers=render_answers(question, chosen_answer_ids, is_answered)
+            )
+        )
+
+    return QuizIDResponse(
+        id=snapshot.id,
+        title=snapshot.title,
+        description=snapshot.description,
+        is_completed=is_completed,
+        questions=questions_response,
+    )
+
+
+def render_submission(snapshot: QuizSnapshot, answer_id: int, chosen_answer_ids: AbstractSet[int],
+                      is_accepted: bool, is_completed: bool) -> AnswerSubmitResponse:
+    question = snapshot.question_by_answer[answer_id]
+    answer = next(answer for answer in question.answers if answer.id == answer_id)
+    return AnswerSubmitResponse(
+        answer_id=answer_id,
+        question_id=question.id,
+        quiz_id=snapshot.id,
+        is_accepted=is_accepted,
+        is_correct=answer.is_correct,
+        is_completed=is_completed,
+        answers=render_answers(question, chosen_answer_ids, True),
+    )
@@ -0,0 +1,82 @@
+"""Incremental hourly/daily rollups of answer submissions.
+
+Run once to catch up with ``python -m app.quiz.rollup``; the app also runs it
+periodically from its lifespan when ROLLUP_INTERVAL_SECONDS is set.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.conf import settings
+from app.database import AsyncSessionLocal
+from app.models import AnswerStatsDaily, AnswerStatsHourly, Question, RollupWatermark, UserQuizAnswer
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = "user_quiz_answer"
+ROLLUP_LOCK_ID = 0x726f6c6c7570
+ROLLUPS = ((AnswerStatsHourly, "hour"), (AnswerStatsDaily, "day"))
+
+
+async def run_rollup(db: AsyncSession, batch_size: int, grace: timedelta) -> int:
+    # The advisory lock keeps workers from rolling up the same rows twice.
+    if not await db.scalar(select(func.pg_try_advisory_xact_lock(ROLLUP_LOCK_ID))):
+        return 0
+
+    last_id = await db.scalar(select(RollupWatermark.last_id).where(RollupWatermark.name == WATERMARK)) or 0
+    # Rows younger than the grace period may still sit behind uncommitted lower IDs.
+    cutoff = datetime.now(timezone.utc) - grace
+    batch = (select(UserQuizAnswer.id)
+             .where(UserQuizAnswer.id > last_id, UserQuizAnswer.created_at < cutoff)
+             .order_by(UserQuizAnswer.id).limit(batch_size).subquery())
+    new_last_id, processed = (await db.execute(select(func.max(batch.c.id), func.count()))).one()
+    if new_last_id is None:
+        return 0
+
+    for model, unit in ROLLUPS:
+        # Inlined literals so the GROUP BY expression matches the selected one.
+        bucket = func.date_trunc(literal_column(f"'{unit}'"), UserQuizAnswer.created_at,
+                                 literal_column("'UTC'")).label("bucket")
+        rows = (select(bucket, UserQuizAnswer.answer_id, UserQuizAnswer.question_id, Question.quiz_id,
+                       func.count().label("count"))
+                .join(Question, Question.id == UserQuizAnswer.question_id)
+                .where(UserQuizAnswer.id > last_id, UserQuizAnswer.id <= new_last_id,
+                       UserQuizAnswer.created_at.is_not(None))
+                .group_by(bucket, UserQuizAnswer.answer_id, UserQuizAnswer.question_id, Question.quiz_id))
+        upsert = pg_insert(model).from_select(["bucket", "answer_id", "question_id", "quiz_id", "count"], rows)
+        await db.execute(upsert.on_conflict_do_update(
+            index_elements=[model.bucket, model.answer_id], set_={"count": model.count + upsert.excluded["count"]}))
+
+    await db.execute(pg_insert(RollupWatermark).values(name=WATERMARK, last_id=new_last_id).on_conflict_do_update(
+        index_elements=[RollupWatermark.name], set_={"last_id": new_last_id}))
+    return processed
+
+
+async def catch_up(batch_size: int | None = None, grace: timedelta | None = None) -> int:
+    batch_size = batch_size or settings.ROLLUP_BATCH_SIZE
+    grace = grace if grace is not None else timedelta(seconds=settings.ROLLUP_GRACE_SECONDS)
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            processed = await run_rollup(db, batch_size, grace)
+            await db.commit()
+        total += processed
+        if processed < batch_size:
+            return total
+
+
+async def run_periodically(interval: float):
+    while True:
+        try:
+            await catch_up()
+        except Exception:
+            logger.exception("Stats rollup failed")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    print(f"Rolled up {asyncio.run(catch_up())} answers")
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.models import Answer, Question, Quiz
+
+
+@dataclass(frozen=True, slots=True)
+class AnswerSnapshot:
+    id: int
+    title: str
+    after_title: str
+    photos_url: Tuple[str, ...] | None
+    is_correct: bool | None
+
+
+@dataclass(frozen=True, slots=True)
+class QuestionSnapshot:
+    id: int
+    title: str
+    description: str | None
+    photos_url: Tuple[str, ...] | None
+    answers: Tuple[AnswerSnapshot, ...]
+    answer_ids: frozenset[int]
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class QuizSnapshot:
+    id: int
+    title: str
+    description: str | None
+    photos_url: Tuple[str, ...] | None
+    preview_photo: str | None
+    questions: Tuple[QuestionSnapshot, ...]
+    answer_ids: frozenset[int]
+    correct_answer_ids: frozenset[int]
+    question_by_answer: Mapping[int, QuestionSnapshot]
+
+
+def _freeze(photos_url):
+    return tuple(photos_url) if photos_url is not None else None
+
+
+def build_snapshot(quiz: Quiz) -> QuizSnapshot:
+    questions = tuple(
+        QuestionSnapshot(
+            id=question.id,
+            title=question.title,
+            description=question.description,
+            photos_url=_freeze(question.photos_url),
+            answers=tuple(
+                AnswerSnapshot(
+                    id=answer.id,
+                    title=answer.title,
+                    after_title=answer.after_title,
+                    photos_url=_freeze(answer.photos_url),
+                    is_correct=answer.is_correct,
+                )
+                for answer in sorted(question.answers, key=lambda a: a.id)
+            ),
+            answer_ids=frozenset(answer.id for answer in question.answers),
+        )
+        for question in sorted(quiz.questions, key=lambda q: q.id)
+    )
+    question_by_answer = {
+        answer.id: question for question in questions for answer in question.answers}
+
+    return QuizSnapshot(
+        id=quiz.id,
+        title=quiz.title,
+        description=quiz.description,
+        photos_url=_freeze(quiz.photos_url),
+        preview_photo=quiz.preview_photo,
+        questions=questions,
+        answer_ids=frozenset(question_by_answer),
+        correct_answer_ids=frozenset(
+            answer.id for question in questions for answer in question.answers if answer.is_correct),
+        question_by_answer=MappingProxyType(question_by_answer),
+    )
+
+
+class QuizSnapshotCache:
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._snapshots: OrderedDict[int, QuizSnapshot] = OrderedDict()
+        self._quiz_by_answer: dict[int, int] = {}
+
+    def get(self, quiz_id: int) -> QuizSnapshot | None:
+        snapshot = self._snapshots.get(quiz_id)
+        if snapshot is not None:
+            self._snapshots.move_to_end(quiz_id)
+        return snapshot
+
+    def put(self, snapshot: QuizSnapshot):
+        self.invalidate(snapshot.id)
+        if self.maxsize <= 0:
+            return
+        self._snapshots[snapshot.id] = snapshot
+        self._quiz_by_answer.update(
+            dict.fromkeys(snapshot.answer_ids, snapshot.id))
+        while len(self._snapshots) > self.maxsize:
+            _, evicted = self._snapshots.popitem(last=False)
+            self._forget_answers(evicted)
+
+    def quiz_id_for_answer(self, answer_id: int) -> int | None:
+        return self._quiz_by_answer.get(answer_id)
+
+    def invalidate(self, quiz_id: int | None = None):
+        if quiz_id is None:
+            self._snapshots.clear()
+            self._quiz_by_answer.clear()
+            return
+        snapshot = self._snapshots.pop(quiz_id, None)
+        if snapshot is not None:
+            self._forget_answers(snapshot)
+
+    def _forget_answers(self, snapshot: QuizSnapshot):
+        for answer_id in snapshot.answer_ids:
+            self._quiz_by_answer.pop(answer_id, None)
+
+
+# Sized from settings in the app lifespan; until then nothing is cached.
+quiz_snapshots = QuizSnapshotCache()
+
+
+async def get_quiz_snapshot(db: AsyncSession, quiz_id: int) -> QuizSnapshot | None:
+    snapshot = quiz_snapshots.get(quiz_id)
+    if snapshot is not None:
+        return snapshot
+
+    quiz = await db.scalar(select(Quiz).options(
+        selectinload(Quiz.questions).selectinload(Question.answers)).where(Quiz.id == quiz_id))
+    if quiz is None:
+        return None
+
+    snapshot = build_snapshot(quiz)
+    quiz_snapshots.put(snapshot)
+    return snapshot
+
+
+async def get_answer_quiz_id(db: AsyncSession, answer_id: int) -> int | None:
+    quiz_id = quiz_snapshots.quiz_id_for_answer(answer_id)
+    if quiz_id is not None:
+        return quiz_id
+    return await db.scalar(select(Question.quiz_id).join(Answer).where(Answer.id == answer_id))
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from typing import Callable, List, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.quiz.submission import PendingStats, reconcile_stats, write_stats
+
+logger = logging.getLogger(__name__)
+
+
+class StatsWriter:
+    def __init__(self, session_factory: Callable[[], AsyncSession], maxsize: int = 0, batch_size: int = 1,
+                 interval: float = 0):
+        self.session_factory = session_factory
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: asyncio.Queue[PendingStats] | None = None
+        self._task: asyncio.Task | None = None
+        # Quizzes with stats that failed to write, rebuilt from the answers on a later pass.
+        self._unreconciled: Set[int] = set()
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(self.maxsize)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+
+    async def flush(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    def submit(self, stats: PendingStats) -> bool:
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(stats)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def save(self, db: AsyncSession, stats: PendingStats):
+        # Falls back to writing on the caller's session when the queue is full or stopped.
+        if not self.submit(stats):
+            await write_stats(db, [stats])
+            await db.commit()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if self._unreconciled:
+                await self._reconcile()
+
+    async def _write(self, batch: List[PendingStats]):
+        try:
+            async with self.session_factory() as db:
+                await write_stats(db, batch)
+                await db.commit()
+            return
+        except Exception:
+            logger.exception("Failed to write a batch of %d stats, retrying one by one", len(batch))
+        for stats in batch:
+            try:
+                async with self.session_factory() as db:
+                    await write_stats(db, [stats])
+                    await db.commit()
+            except Exception:
+                # Never log user_id: it is the caller's Authorization value.
+                logger.exception("Failed to write stats for quiz %s, leaving them to reconciliation",
+                                 stats.quiz_id)
+                self._unreconciled.add(stats.quiz_id)
+
+    async def _reconcile(self):
+        quiz_ids, self._unreconciled = self._unreconciled, set()
+        try:
+            async with self.session_factory() as db:
+                restored = await reconcile_stats(db, quiz_ids)
+                await db.commit()
+        except Exception:
+            self._unreconciled |= quiz_ids
+            logger.exception("Failed to reconcile stats for quizzes %s", sorted(quiz_ids))
+            return
+        logger.warning("Restored %d stats rows for quizzes %s", restored, sorted(quiz_ids))
+
+
+async def reconcile_all() -> int:
+    async with AsyncSessionLocal() as db:
+        restored = await reconcile_stats(db)
+        await db.commit()
+    return restored
+
+
+# Sized from settings in the app lifespan before it is started.
+stats_queue = StatsWriter(AsyncSessionLocal)
+
+
+if __name__ == "__main__":
+    # Pending stats do not survive a restart; this rebuilds any that were lost.
+    print(f"Restored {asyncio.run(reconcile_all())} stats rows")
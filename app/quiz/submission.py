@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import AbstractSet, Iterable, Sequence, Set
+
+from sqlalchemy import Integer, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Answer, AnswerCounter, Question, Stats, UserQuizAnswer
+from app.quiz.snapshot import QuizSnapshot
+
+
+async def record_answers(db: AsyncSession, user_id: str, snapshot: QuizSnapshot,
+                         answer_ids: Iterable[int]) -> Set[int]:
+    inserted = (pg_insert(UserQuizAnswer)
+                .values([{"user_id": user_id, "answer_id": answer_id,
+                          "question_id": snapshot.question_by_answer[answer_id].id}
+                         for answer_id in answer_ids])
+                .on_conflict_do_nothing(index_elements=[UserQuizAnswer.user_id, UserQuizAnswer.question_id])
+                .returning(UserQuizAnswer.answer_id)
+                .cte("inserted"))
+    counters = (pg_insert(AnswerCounter)
+                .from_select(["answer_id", "count"], select(inserted.c.answer_id, literal(1)))
+                .on_conflict_do_update(index_elements=[AnswerCounter.answer_id],
+                                       set_={"count": AnswerCounter.count + 1})
+                .returning(AnswerCounter.answer_id))
+    return set(await db.scalars(counters))
+
+
+@dataclass(frozen=True, slots=True)
+class PendingStats:
+    user_id: str
+    quiz_id: int
+    correct_answer_ids: frozenset[int]
+    total: int
+
+
+def make_stats(user_id: str, snapshot: QuizSnapshot, chosen_answer_ids: AbstractSet[int]) -> PendingStats:
+    return PendingStats(user_id=user_id, quiz_id=snapshot.id,
+                        correct_answer_ids=frozenset(chosen_answer_ids & snapshot.correct_answer_ids),
+                        total=len(snapshot.questions))
+
+
+async def write_stats(db: AsyncSession, pending: Sequence[PendingStats]):
+    by_key = {(stats.user_id, stats.quiz_id): stats for stats in pending}
+    await db.execute(
+        pg_insert(Stats)
+        .values([{"user_id": stats.user_id, "quiz_id": stats.quiz_id,
+                  "correct_count": len(stats.correct_answer_ids), "total": stats.total,
+                  "correct_answer_ids": sorted(stats.correct_answer_ids)}
+                 for stats in by_key.values()])
+        .on_conflict_do_nothing(index_elements=[Stats.user_id, Stats.quiz_id]))
+
+
+async def reconcile_stats(db: AsyncSession, quiz_ids: Iterable[int] | None = None) -> int:
+    # Stats are derived from user_quiz_answer, so a row lost to a failed write is rebuilt
+    # for every user who answered all questions of a quiz but has no stats for it.
+    is_correct = Answer.is_correct.is_(True)
+    answered = (select(UserQuizAnswer.user_id, Question.quiz_id,
+                       func.count(UserQuizAnswer.question_id.distinct()).label("answered"),
+                       func.count().filter(is_correct).label("correct_count"),
+                       func.coalesce(func.array_agg(aggregate_order_by(UserQuizAnswer.answer_id,
+                                                                       UserQuizAnswer.answer_id)).filter(is_correct),
+                                     cast([], ARRAY(Integer))).label("correct_answer_ids"))
+                .join(Question, Question.id == UserQuizAnswer.question_id)
+                .join(Answer, Answer.id == UserQuizAnswer.answer_id)
+                .group_by(UserQuizAnswer.user_id, Question.quiz_id))
+    totals = select(Question.quiz_id, func.count().label("total")).group_by(Question.quiz_id)
+    if quiz_ids is not None:
+        quiz_ids = list(quiz_ids)
+        answered = answered.where(Question.quiz_id.in_(quiz_ids))
+        totals = totals.where(Question.quiz_id.in_(quiz_ids))
+    answered = answered.subquery()
+    totals = totals.subquery()
+
+    completed = (select(answered.c.user_id, answered.c.quiz_id, answered.c.correct_count, totals.c.total,
+                        answered.c.correct_answer_ids)
+                 .join(totals, totals.c.quiz_id == answered.c.quiz_id)
+                 .where(answered.c.answered == totals.c.total))
+    result = await db.execute(
+        pg_insert(Stats)
+        .from_select(["user_id", "quiz_id", "correct_count", "total", "correct_answer_ids"], completed)
+        .on_conflict_do_nothing(index_elements=[Stats.user_id, Stats.quiz_id]))
+    return result.rowcount
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from typing import AbstractSet, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import UserQuizAnswer
+from app.quiz.snapshot import QuizSnapshot
+
+UserQuizKey = Tuple[str, int]
+
+
+class UserAnswersCache:
+    def __init__(self, maxsize: int = 0, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[UserQuizKey, Tuple[float, frozenset[int]]] = OrderedDict()
+
+    def get(self, user_id: str, quiz_id: int) -> frozenset[int] | None:
+        key = (user_id, quiz_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, answer_ids = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return answer_ids
+
+    def put(self, user_id: str, quiz_id: int, answer_ids: AbstractSet[int]):
+        if self.maxsize <= 0:
+            return
+        key = (user_id, quiz_id)
+        self._entries[key] = (time.monotonic() + self.ttl, frozenset(answer_ids))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+# Sized from settings in the app lifespan; until then nothing is cached.
+user_answer_cache = UserAnswersCache()
+
+
+async def load_user_answer_ids(db: AsyncSession, user_id: str, snapshot: QuizSnapshot) -> frozenset[int]:
+    if not snapshot.answer_ids:
+        return frozenset()
+    return frozenset(await db.scalars(select(UserQuizAnswer.answer_id).where(
+        UserQuizAnswer.user_id == user_id, UserQuizAnswer.answer_id.in_(snapshot.answer_ids))))
+
+
+async def get_user_answer_ids(db: AsyncSession, user_id: str, snapshot: QuizSnapshot,
+                              use_cache: bool = True) -> frozenset[int]:
+    answer_ids = user_answer_cache.get(user_id, snapshot.id) if use_cache else None
+    if answer_ids is None:
+        answer_ids = await load_user_answer_ids(db, user_id, snapshot)
+        user_answer_cache.put(user_id, snapshot.id, answer_ids)
+    return answer_ids
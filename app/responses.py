@@ -0,0 +1,27 @@
+from typing import Any, List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.schemas import AnswerSubmitResponse, ArticleResponse, GalleryPhotoResponse, Page, QuizHistoryResponse, \
+    QuizIDResponse, QuizResponse, QuizStatsResponse, ScoreResponse, SearchResultResponse
+
+# Returning a Response directly skips FastAPI's response_model re-validation and
+# its jsonable_encoder pass; the adapters below serialize straight to JSON bytes.
+quiz_list_adapter = TypeAdapter(List[QuizResponse])
+quiz_adapter = TypeAdapter(QuizIDResponse)
+answer_submit_adapter = TypeAdapter(AnswerSubmitResponse)
+quiz_stats_adapter = TypeAdapter(QuizStatsResponse)
+quiz_history_adapter = TypeAdapter(QuizHistoryResponse)
+article_list_adapter = TypeAdapter(List[ArticleResponse])
+article_page_adapter = TypeAdapter(Page[ArticleResponse])
+gallery_list_adapter = TypeAdapter(List[GalleryPhotoResponse])
+gallery_page_adapter = TypeAdapter(Page[GalleryPhotoResponse])
+search_page_adapter = TypeAdapter(Page[SearchResultResponse])
+score_page_adapter = TypeAdapter(Page[ScoreResponse])
+
+
+def json_response(adapter: TypeAdapter, content: Any, validate: bool = False) -> Response:
+    if validate:
+        content = adapter.validate_python(content, from_attributes=True)
+    return Response(adapter.dump_json(content), media_type="application/json")
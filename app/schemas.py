@@ -1,5 +1,8 @@
-from typing import List, Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, Generic, List, Literal, Optional, TypeVar
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
 
 
 class AnswerResponse(BaseModel):
@@ -45,6 +48,20 @@ class QuizIDResponse(QuizResponse):
         from_attributes = True
 
 
+class AnswerSubmitResponse(BaseModel):
+    answer_id: int
+    question_id: int
+    quiz_id: int
+    is_accepted: bool
+    is_correct: Optional[bool] = None
+    is_completed: bool = False
+    answers: List[AnswerResponse] = []
+
+
+class AnswerBatchCreate(BaseModel):
+    answer_ids: List[int]
+
+
 class AnswerCreate(BaseModel):
     title: str
     after_title: str
@@ -97,6 +114,34 @@ class ArticleUpdateBody(BaseModel):
 
 class MediaResponse(BaseModel):
     url: str
+    variants: Dict[int, str] = {}
+
+
+class UploadPresignBody(BaseModel):
+    filename: str
+    content_type: str | None = None
+    parts: int = Field(1, ge=1, le=10000)
+
+
+class UploadPresignResponse(BaseModel):
+    key: str
+    upload_id: str
+    part_urls: List[str]
+    expires_in: int
+
+
+class UploadPart(BaseModel):
+    part_number: int = Field(ge=1, le=10000)
+    etag: str
+
+
+class UploadAbortBody(BaseModel):
+    key: str
+    upload_id: str
+
+
+class UploadConfirmBody(UploadAbortBody):
+    parts: List[UploadPart] = Field(min_length=1)
 
 
 class AnswerStatsResponse(BaseModel):
@@ -126,6 +171,35 @@ class QuizStatsResponse(BaseModel):
         from_attributes = True
 
 
+class ScoreResponse(BaseModel):
+    quiz_id: int
+    correct_count: int
+    total: int
+
+    class Config:
+        from_attributes = True
+
+
+class QuizRankResponse(ScoreResponse):
+    rank: int
+    participants: int
+
+
+class QuestionHistoryResponse(BaseModel):
+    bucket: datetime
+    question_id: int
+    correct_answers: int
+    incorrect_answers: int
+    answers: List[AnswerStatsResponse] = []
+
+
+class QuizHistoryResponse(BaseModel):
+    granularity: Literal["hour", "day"]
+    start: datetime
+    end: datetime
+    points: List[QuestionHistoryResponse] = []
+
+
 class GalleryPhotoCreate(BaseModel):
     title: str | None = None
     description: str | None = None
@@ -142,3 +216,22 @@ class GalleryPhotoResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T] = []
+    next_cursor: str | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class SearchResultResponse(BaseModel):
+    kind: Literal["article", "quiz"]
+    id: int
+    title: str
+    description: Optional[str] = None
+    rank: float
+
+    class Config:
+        from_attributes = True
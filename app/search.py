@@ -0,0 +1,45 @@
+from typing import List, Literal
+
+from sqlalchemy import Row, func, literal_column, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Article, ArticleStatus, Question, Quiz
+
+SearchKind = Literal["article", "quiz"]
+
+# Must match the configuration the generated search_vector columns are built with.
+SEARCH_CONFIG = literal_column("'russian'::regconfig")
+
+
+def article_matches(query):
+    return select(
+        literal_column("'article'").label("kind"), Article.id, Article.title, Article.description,
+        func.ts_rank(Article.search_vector, query).label("rank"),
+    ).where(Article.search_vector.op("@@")(query), Article.status == ArticleStatus.PUBLISHED)
+
+
+def quiz_matches(query):
+    # A quiz is found by its own text or by any of its questions, ranked by the best hit.
+    hits = union_all(
+        select(Quiz.id.label("quiz_id"), func.ts_rank(Quiz.search_vector, query).label("rank"))
+        .where(Quiz.search_vector.op("@@")(query)),
+        select(Question.quiz_id, func.ts_rank(Question.search_vector, query))
+        .where(Question.search_vector.op("@@")(query)),
+    ).subquery()
+    best = select(hits.c.quiz_id, func.max(hits.c.rank).label("rank")).group_by(hits.c.quiz_id).subquery()
+    return select(
+        literal_column("'quiz'").label("kind"), Quiz.id, Quiz.title, Quiz.description, best.c.rank,
+    ).join(best, best.c.quiz_id == Quiz.id)
+
+
+async def search(db: AsyncSession, text: str, kind: SearchKind | None, limit: int, offset: int) -> List[Row]:
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    parts = [matches(query) for name, matches in (("article", article_matches), ("quiz", quiz_matches))
+             if kind in (None, name)]
+    results = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+    return (await db.execute(
+        select(results)
+        .order_by(results.c.rank.desc(), results.c.kind, results.c.id)
+        .limit(limit)
+        .offset(offset)
+    )).all()
@@ -0,0 +1,77 @@
+"""In-memory stand-in for the Minio client used by S3Service."""
+import hashlib
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict
+
+from minio.error import S3Error
+
+from app.media.service import S3Service
+
+
+@dataclass
+class StoredObject:
+    data: bytes
+    content_type: str
+    metadata: dict = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def etag(self) -> str:
+        return hashlib.md5(self.data).hexdigest()
+
+
+class FakeObjectStore:
+    def __init__(self):
+        self.objects: Dict[tuple[str, str], StoredObject] = {}
+        self._lock = threading.Lock()
+
+    def _missing(self, bucket_name: str, object_name: str) -> S3Error:
+        return S3Error("NoSuchKey", "Object does not exist", f"/{bucket_name}/{object_name}",
+                       "fake", "fake", None, bucket_name, object_name)
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return True
+
+    def put_object(self, bucket_name, object_name, data, length, content_type="application/octet-stream",
+                   metadata=None, part_size=0, **kwargs):
+        chunks = []
+        while True:
+            chunk = data.read(part_size or 1024 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if 0 <= length <= sum(map(len, chunks)):
+                break
+        with self._lock:
+            self.objects[bucket_name, object_name] = StoredObject(b"".join(chunks), content_type, metadata or {})
+
+    def stat_object(self, bucket_name, object_name, **kwargs) -> StoredObject:
+        with self._lock:
+            stored = self.objects.get((bucket_name, object_name))
+        if stored is None:
+            raise self._missing(bucket_name, object_name)
+        return stored
+
+    def get_presigned_url(self, method, bucket_name, object_name, expires=None, extra_query_params=None, **kwargs):
+        query = "&".join(f"{key}={value}" for key, value in (extra_query_params or {}).items())
+        return f"http://fake.local/{bucket_name}/{object_name}?{query}&X-Amz-Signature=fake"
+
+    def _create_multipart_upload(self, bucket_name, object_name, headers):
+        return uuid.uuid4().hex
+
+    def _complete_multipart_upload(self, bucket_name, object_name, upload_id, parts):
+        with self._lock:
+            self.objects.setdefault((bucket_name, object_name), StoredObject(b"", "application/octet-stream"))
+
+    def _abort_multipart_upload(self, bucket_name, object_name, upload_id):
+        pass
+
+
+def make_fake_s3_service(bucket_name: str = "bench", endpoint: str = "fake.local") -> S3Service:
+    return S3Service(access_key="", secret_key="", endpoint=endpoint, bucket_name=bucket_name,
+                     client=FakeObjectStore())
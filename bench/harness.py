@@ -0,0 +1,373 @@
+"""Drive every API route at a fixed concurrency and report latency, throughput and DB load.
+
+    python -m bench.harness --base-url http://127.0.0.1:8000 --concurrency 32 --requests 2000 \\
+        --output results/run.json [--baseline results/previous.json]
+
+Fixture IDs (quizzes, answers, articles, users with stats) are read from the database the
+server is using, so run ``python -m bench.seed`` first. Queries per request are taken from
+the server's own ``db_queries_total`` counters on ``/metrics``. The upload scenarios never
+send file parts, so confirming only succeeds against ``python -m bench.serve``'s in-memory
+object store. Catalogue export/import is CLI-only (``python -m app.catalogue``) and is not
+driven from here.
+"""
+import argparse
+import http.client
+import json
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List
+from urllib.parse import quote, urlsplit
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import Answer, Article, ArticleStatus, Question, Quiz, Stats
+
+METRIC_LINE = re.compile(r'^db_queries_total\{route="(?P<route>[^"]*)"\} (?P<value>\S+)$')
+# Stems of words bench.seed puts into titles and descriptions, plus one that matches nothing.
+SEARCH_TERMS = ["викторина", "вопрос", "статья", "описание", "викторина -статья", "несуществующее"]
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    body: bytes | None = None
+    content_type: str = "application/json"
+    user_id: str | None = None
+    headers: Dict[str, str] | None = None
+
+
+@dataclass
+class Scenario:
+    name: str
+    route: str
+    make_request: Callable[[random.Random], Request]
+
+
+@dataclass
+class Fixtures:
+    quiz_ids: List[int]
+    answer_ids: List[int]
+    quiz_answers: List[tuple[int, int]]
+    # quiz id -> answer ids of each of its questions
+    quiz_questions: Dict[int, List[List[int]]]
+    article_ids: List[int]
+    stats: List[tuple[str, int]]
+
+
+def load_fixtures() -> Fixtures:
+    with SessionLocal() as db:
+        return Fixtures(
+            quiz_ids=list(db.scalars(select(Quiz.id))),
+            answer_ids=list(db.scalars(select(Answer.id).join(Question))),
+            quiz_answers=[tuple(row) for row in db.execute(
+                select(Question.quiz_id, Answer.id).join(Answer.question).limit(10000))],
+            quiz_questions=group_answers(db.execute(
+                select(Question.quiz_id, Question.id, Answer.id).join(Answer.question)
+                .order_by(Question.quiz_id, Question.id).limit(10000))),
+            article_ids=list(db.scalars(select(Article.id).where(Article.status == ArticleStatus.PUBLISHED))),
+            stats=[tuple(row) for row in db.execute(select(Stats.user_id, Stats.quiz_id).limit(10000))],
+        )
+
+
+def group_answers(rows: Iterable[tuple[int, int, int]]) -> Dict[int, List[List[int]]]:
+    questions: Dict[int, Dict[int, List[int]]] = {}
+    for quiz_id, question_id, answer_id in rows:
+        questions.setdefault(quiz_id, {}).setdefault(question_id, []).append(answer_id)
+    return {quiz_id: list(answers.values()) for quiz_id, answers in questions.items()}
+
+
+def json_body(payload) -> bytes:
+    return json.dumps(payload).encode()
+
+
+def multipart_body(rng: random.Random) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    payload = rng.randbytes(rng.randint(16 * 1024, 256 * 1024))
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def quiz_payload(rng: random.Random, questions: int = 10, answers: int = 4) -> dict:
+    return {
+        "title": f"bench {rng.random()}",
+        "questions": [{
+            "title": f"question {q}",
+            "answers": [{"title": f"answer {a}", "after_title": "", "photos_url": None, "is_correct": a == 0}
+                        for a in range(answers)],
+        } for q in range(questions)],
+    }
+
+
+def build_scenarios(fixtures: Fixtures, users: int, client: "Client") -> List[Scenario]:
+    def user(rng):
+        return f"bench-user-{rng.randrange(users)}"
+
+    def submit_answers(rng):
+        quiz_id = rng.choice(list(fixtures.quiz_questions))
+        answer_ids = [rng.choice(answers) for answers in fixtures.quiz_questions[quiz_id]]
+        return Request("POST", f"/quiz/{quiz_id}/answers", json_body({"answer_ids": answer_ids}),
+                       user_id=f"bench-load-{uuid.uuid4().hex}")
+
+    def presign_body(rng) -> bytes:
+        return json_body({"filename": "bench.jpg", "content_type": "image/jpeg", "parts": rng.randint(1, 4)})
+
+    def confirm_upload(rng):
+        # Presigned while the requests are prepared, so only the confirm itself is timed.
+        status, body = client.send(Request("POST", "/upload/presign", presign_body(rng)))
+        if status != 200:
+            raise RuntimeError(f"/upload/presign answered {status}: {body[:200]!r}")
+        presigned = json.loads(body)
+        parts = [{"part_number": number, "etag": uuid.uuid4().hex}
+                 for number in range(1, len(presigned["part_urls"]) + 1)]
+        return Request("POST", "/upload/confirm", json_body(
+            {"key": presigned["key"], "upload_id": presigned["upload_id"], "parts": parts}))
+
+    def history(rng):
+        user_id, quiz_id = rng.choice(fixtures.stats)
+        granularity = rng.choice(["hour", "day"])
+        return Request("GET", f"/stats/{quiz_id}/history?granularity={granularity}", user_id=user_id)
+
+    def search(rng):
+        kind = rng.choice(["", "&kind=article", "&kind=quiz"])
+        return Request("GET", f"/search?q={quote(rng.choice(SEARCH_TERMS))}{kind}")
+
+    def stats(rng):
+        user_id, quiz_id = rng.choice(fixtures.stats)
+        return Request("GET", f"/stats/{quiz_id}", user_id=user_id)
+
+    def rank(rng):
+        user_id, quiz_id = rng.choice(fixtures.stats)
+        return Request("GET", f"/stats/{quiz_id}/rank", user_id=user_id)
+
+    def upload(rng):
+        body, content_type = multipart_body(rng)
+        return Request("POST", "/upload", body, content_type)
+
+    scenarios = [
+        Scenario("list quizzes", "/quiz", lambda rng: Request("GET", "/quiz", user_id=user(rng))),
+        Scenario("get quiz", "/quiz/{quiz_id}",
+                 lambda rng: Request("GET", f"/quiz/{rng.choice(fixtures.quiz_ids)}", user_id=user(rng))),
+        Scenario("submit answer", "/answer/{answer_id}",
+                 lambda rng: Request("POST", f"/answer/{rng.choice(fixtures.answer_ids)}",
+                                     user_id=f"bench-load-{uuid.uuid4().hex}")),
+        Scenario("create quiz", "/quiz",
+                 lambda rng: Request("POST", "/quiz", json_body(quiz_payload(rng)), user_id="bench")),
+        Scenario("create quizzes in bulk", "/quiz/bulk",
+                 lambda rng: Request("POST", "/quiz/bulk", json_body([quiz_payload(rng) for _ in range(10)]),
+                                     user_id="bench")),
+        Scenario("list articles", "/article", lambda rng: Request("GET", "/article")),
+        Scenario("list articles unpaginated", "/article", lambda rng: Request("GET", "/article?unpaginated=true")),
+        Scenario("get article", "/article/{article_id}",
+                 lambda rng: Request("GET", f"/article/{rng.choice(fixtures.article_ids)}")),
+        Scenario("create article", "/article",
+                 lambda rng: Request("POST", "/article", json_body({"title": "bench", "author": "bench"}))),
+        Scenario("update article", "/article/{article_id}",
+                 lambda rng: Request("PATCH", f"/article/{rng.choice(fixtures.article_ids)}",
+                                     json_body({"description": f"bench {rng.random()}"}))),
+        Scenario("list gallery", "/gallery", lambda rng: Request("GET", "/gallery")),
+        Scenario("create gallery photo", "/gallery",
+                 lambda rng: Request("POST", "/gallery", json_body({"url": "https://bench/x.jpg",
+                                                                    "order": rng.randint(0, 1000)}))),
+        Scenario("upload", "/upload", upload),
+        Scenario("presign upload", "/upload/presign",
+                 lambda rng: Request("POST", "/upload/presign", presign_body(rng))),
+        Scenario("confirm upload", "/upload/confirm", confirm_upload),
+        Scenario("search", "/search", search),
+    ]
+    if fixtures.quiz_questions:
+        scenarios.append(Scenario("submit answers in bulk", "/quiz/{quiz_id}/answers", submit_answers))
+    if fixtures.stats:
+        scenarios.append(Scenario("get stats", "/stats/{quiz_id}", stats))
+        scenarios.append(Scenario("get rank", "/stats/{quiz_id}/rank", rank))
+        scenarios.append(Scenario("quiz history", "/stats/{quiz_id}/history", history))
+        scenarios.append(Scenario("list scores", "/stats",
+                                  lambda rng: Request("GET", "/stats", user_id=rng.choice(fixtures.stats)[0])))
+    return scenarios
+
+
+class Client:
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.local = threading.local()
+
+    def connection(self) -> http.client.HTTPConnection:
+        if not hasattr(self.local, "connection"):
+            self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return self.local.connection
+
+    def send(self, request: Request) -> tuple[int, bytes]:
+        status, body, _ = self.exchange(request)
+        return status, body
+
+    def exchange(self, request: Request) -> tuple[int, bytes, http.client.HTTPMessage]:
+        headers = {"Content-Type": request.content_type}
+        if request.user_id is not None:
+            headers["Authorization"] = request.user_id
+        headers.update(request.headers or {})
+        connection = self.connection()
+        try:
+            connection.request(request.method, request.path, body=request.body, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read(), response.headers
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            del self.local.connection
+            raise
+
+
+def scrape_queries(client: Client) -> Dict[str, float]:
+    status, body = client.send(Request("GET", "/metrics"))
+    if status != 200:
+        return {}
+    totals = {}
+    for line in body.decode().splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            totals[match["route"]] = totals.get(match["route"], 0.0) + float(match["value"])
+    return totals
+
+
+def check_read_your_writes(client: Client, fixtures: Fixtures, samples: int, seed: int) -> int:
+    # The quiz is read once before the submit so a per-process answer cache or a lagging
+    # replica holds the stale state; the follow-up read must still show the new answer.
+    rng = random.Random(seed)
+    stale = 0
+    for _ in range(samples):
+        quiz_id, answer_id = rng.choice(fixtures.quiz_answers)
+        user_id = f"bench-consistency-{uuid.uuid4().hex}"
+        client.send(Request("GET", f"/quiz/{quiz_id}", user_id=user_id))
+        status, _, headers = client.exchange(Request("POST", f"/answer/{answer_id}", user_id=user_id))
+        if status >= 400:
+            continue
+        # Echoed the way an API client authenticating by header would, without a cookie jar.
+        read_primary_until = headers.get("X-Read-Primary-Until")
+        status, body = client.send(Request("GET", f"/quiz/{quiz_id}", user_id=user_id, headers={
+            "X-Read-Primary-Until": read_primary_until} if read_primary_until else None))
+        chosen = {answer["id"] for question in json.loads(body)["questions"]
+                  for answer in question["answers"] if answer["is_chosen"]} if status == 200 else set()
+        stale += answer_id not in chosen
+    return stale
+
+
+def percentile(values: List[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run_scenario(client: Client, scenario: Scenario, requests: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    prepared = [scenario.make_request(rng) for _ in range(requests)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(request: Request):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            status, _ = client.send(request)
+            failed = status >= 400
+        except (http.client.HTTPException, OSError):
+            failed = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += failed
+
+    before = scrape_queries(client)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, prepared))
+    duration = time.perf_counter() - start
+    after = scrape_queries(client)
+
+    queries = after.get(scenario.route, 0.0) - before.get(scenario.route, 0.0)
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(requests / duration, 1) if duration else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "queries_per_request": round(queries / requests, 2) if after else None,
+    }
+
+
+def print_report(results: Dict[str, dict], baseline: Dict[str, dict] | None):
+    header = f"{'scenario':<28}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}{'err':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        print(f"{name:<28}{result['throughput_rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['p99_ms']:>10}{str(result['queries_per_request']):>8}{result['errors']:>6}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            print(f"{'  vs baseline':<28}{result['throughput_rps'] - previous['throughput_rps']:>+10.1f}"
+                  f"{result['p50_ms'] - previous['p50_ms']:>+10.2f}{result['p95_ms'] - previous['p95_ms']:>+10.2f}"
+                  f"{result['p99_ms'] - previous['p99_ms']:>+10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API route")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--users", type=int, default=500, help="number of seeded users to read as")
+    parser.add_argument("--only", action="append", help="run only the named scenario(s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--consistency-samples", type=int, default=50,
+                        help="submit-then-read probes checking read-your-writes; 0 to skip")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    client = Client(args.base_url)
+    fixtures = load_fixtures()
+    scenarios = build_scenarios(fixtures, args.users, client)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.only]
+
+    results = {scenario.name: run_scenario(client, scenario, args.requests, args.concurrency, args.seed)
+               for scenario in scenarios}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline)
+
+    stale = 0
+    if args.consistency_samples and fixtures.quiz_answers:
+        stale = check_read_your_writes(client, fixtures, args.consistency_samples, args.seed)
+        print(f"read-your-writes: {stale} of {args.consistency_samples} reads missed the user's own answer")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "timestamp": time.time(),
+                "base_url": args.base_url,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "results": results,
+            }, f, indent=2, ensure_ascii=False)
+
+    if stale:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Seed a local Postgres with a synthetic catalogue for benchmarking.
+
+    python -m bench.seed --quizzes 200 --questions 20 --answers 4 --users 1000 --reset
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, text
+
+from app.database import get_engine
+from app.models import Answer, Article, ArticleStatus, GalleryPhoto, Question, Quiz, Stats, UserQuizAnswer
+
+TABLES = ["stats", "answer_counters", "answer_stats_hourly", "answer_stats_daily",
+          "rollup_watermarks", "user_quiz_answer", "answers", "questions", "quizzes",
+          "articles", "gallery_photos"]
+
+
+def bench_user_id(index: int) -> str:
+    return f"bench-user-{index}"
+
+
+def seed(quizzes: int, questions: int, answers: int, users: int, articles: int, photos: int,
+         completion: float, history_days: int, seed_value: int, reset: bool):
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+
+    with get_engine().begin() as conn:
+        if reset:
+            conn.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+
+        quiz_ids = conn.scalars(insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True), [
+            dict(title=f"Викторина {i}", description=f"Описание викторины {i}", photos_url=None,
+                 preview_photo=None)
+            for i in range(quizzes)]).all()
+
+        question_rows = [(quiz_id, i) for quiz_id in quiz_ids for i in range(questions)]
+        question_ids = conn.scalars(insert(Question).returning(Question.id, sort_by_parameter_order=True), [
+            dict(title=f"Вопрос {i}", description=None, photos_url=None, quiz_id=quiz_id)
+            for quiz_id, i in question_rows]).all()
+
+        answer_rows = [(question_id, i, i == 0) for question_id in question_ids for i in range(answers)]
+        answer_ids = conn.scalars(insert(Answer).returning(Answer.id, sort_by_parameter_order=True), [
+            dict(title=f"Ответ {i}", after_title=f"Пояснение {i}", photos_url=None, is_correct=is_correct,
+                 question_id=question_id)
+            for question_id, i, is_correct in answer_rows]).all()
+
+        layout = {}
+        for (question_id, _, is_correct), answer_id in zip(answer_rows, answer_ids):
+            layout.setdefault(question_id, []).append((answer_id, is_correct))
+        quiz_questions = {}
+        for (quiz_id, _), question_id in zip(question_rows, question_ids):
+            quiz_questions.setdefault(quiz_id, []).append(question_id)
+
+        for user in range(users):
+            user_id = bench_user_id(user)
+            user_answers = []
+            completed = []
+            for quiz_id in quiz_ids:
+                roll = rng.random()
+                if roll >= completion * 2:
+                    continue
+                is_complete = roll < completion
+                chosen = quiz_questions[quiz_id]
+                if not is_complete:
+                    chosen = chosen[:rng.randint(0, len(chosen) - 1)]
+                picked = [(question_id, *rng.choice(layout[question_id])) for question_id in chosen]
+                user_answers.extend(
+                    dict(user_id=user_id, question_id=question_id, answer_id=answer_id,
+                         created_at=now - timedelta(seconds=rng.randrange(history_days * 86400)))
+                    for question_id, answer_id, _ in picked)
+                if is_complete:
+                    completed.append((quiz_id, [answer_id for _, answer_id, is_correct in picked if is_correct]))
+
+            if user_answers:
+                conn.execute(insert(UserQuizAnswer), user_answers)
+            if completed:
+                conn.execute(insert(Stats), [
+                    dict(user_id=user_id, quiz_id=quiz_id, correct_count=len(answer_ids),
+                         total=len(quiz_questions[quiz_id]), correct_answer_ids=sorted(answer_ids))
+                    for quiz_id, answer_ids in completed])
+
+        conn.execute(text("DELETE FROM answer_counters"))
+        conn.execute(text("""
+            INSERT INTO answer_counters (answer_id, count)
+            SELECT answer_id, count(*) FROM user_quiz_answer GROUP BY answer_id
+        """))
+
+        if articles:
+            conn.execute(insert(Article), [
+                dict(title=f"Статья {i}", description=f"Описание статьи {i}", author="bench",
+                     content_url=None, photo_url=None,
+                     status=ArticleStatus.PUBLISHED if rng.random() < 0.9 else ArticleStatus.DRAFT)
+                for i in range(articles)])
+        if photos:
+            conn.execute(insert(GalleryPhoto), [
+                dict(title=f"Фото {i}", description=None, order=rng.randint(0, photos), url=f"https://bench/{i}.jpg")
+                for i in range(photos)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with a synthetic benchmark dataset")
+    parser.add_argument("--quizzes", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--answers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--articles", type=int, default=500)
+    parser.add_argument("--photos", type=int, default=500)
+    parser.add_argument("--completion", type=float, default=0.3,
+                        help="share of quizzes each user completes; the same share is left half-done")
+    parser.add_argument("--history-days", type=int, default=30,
+                        help="spread answer timestamps over this many past days")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="truncate all content tables first")
+    args = parser.parse_args()
+    if args.questions < 1 or args.answers < 1:
+        parser.error("every quiz needs at least one question and every question at least one answer")
+
+    seed(args.quizzes, args.questions, args.answers, args.users, args.articles, args.photos,
+         args.completion, args.history_days, args.seed, args.reset)
+
+
+if __name__ == "__main__":
+    main()
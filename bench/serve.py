@@ -0,0 +1,26 @@
+"""Run the API with the object store replaced by an in-memory fake.
+
+    python -m bench.serve --port 8000
+"""
+import argparse
+
+import uvicorn
+
+from app.media import get_s3_service
+from bench.fake_s3 import FakeObjectStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app against an in-memory object store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    get_s3_service().client = FakeObjectStore()
+
+    from app.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
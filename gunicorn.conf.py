@@ -0,0 +1,43 @@
+"""Multi-process serving: ``gunicorn app.main:app -c gunicorn.conf.py``.
+
+Worker count defaults to the CPUs available to the container and can be
+overridden with WEB_CONCURRENCY. Metrics from all workers are aggregated through
+PROMETHEUS_MULTIPROC_DIR, which is wiped on startup so samples of a previous run
+don't leak into the new one.
+"""
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def available_cpus() -> int:
+    # Respects the cpuset a container is pinned to, unlike os.cpu_count().
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn_worker.UvicornWorker"
+# Async workers are CPU-bound only between awaits, so one per core keeps every core busy.
+workers = int(os.environ.get("WEB_CONCURRENCY", available_cpus()))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 10))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 30))
+keepalive = 5
+# Set MAX_REQUESTS to recycle workers periodically; the jitter keeps them from
+# restarting all at once.
+max_requests = int(os.environ.get("MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+accesslog = None
+
+
+def on_starting(server):
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)